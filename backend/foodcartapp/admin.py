@@ -1,26 +1,98 @@
 from django.contrib import admin
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import Count, Sum
 from django.http import HttpResponseRedirect
 from django.shortcuts import reverse
-from django.templatetags.static import static
-from django.utils.html import format_html
+from django.utils.functional import cached_property
+from django.utils.html import format_html, format_html_join
 from django.utils.http import url_has_allowed_host_and_scheme
 
+from .models import Banner
 from .models import Product
 from .models import ProductCategory
 from .models import Restaurant
 from .models import RestaurantMenuItem
+from .thumbnails import get_thumbnail_url
 from .models import OrderProduct
 from .models import Order
+from .models import OrderGeocodeTask
+from .models import OrderStatusEvent
+from .models import ArchivedOrder
+from .models import ArchivedOrderProduct
+
+
+class EstimatedCountPaginator(Paginator):
+    """Paginator that does not count rows of huge unfiltered tables.
+
+    On PostgreSQL the row count of an unfiltered changelist is taken from
+    table statistics, which is instant but approximate.
+    """
+    exact_count_limit = 10000
+
+    @cached_property
+    def count(self):
+        query = getattr(self.object_list, 'query', None)
+        if query is None or query.where:
+            return super().count
+        connection = connections[self.object_list.db]
+        if connection.vendor != 'postgresql':
+            return super().count
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT reltuples FROM pg_class WHERE oid = %s::regclass',
+                [self.object_list.model._meta.db_table],
+            )
+            row = cursor.fetchone()
+        estimate = int(row[0]) if row else -1
+        if estimate < self.exact_count_limit:
+            return super().count
+        return estimate
 
 
 class RestaurantMenuItemInline(admin.TabularInline):
     model = RestaurantMenuItem
     extra = 0
+    autocomplete_fields = [
+        'restaurant',
+        'product',
+    ]
 
 
 class OrderProductInline(admin.TabularInline):
     model = OrderProduct
     extra = 1
+    autocomplete_fields = [
+        'product',
+    ]
+
+
+class OrderStatusEventInline(admin.TabularInline):
+    model = OrderStatusEvent
+    extra = 0
+    can_delete = False
+    readonly_fields = [
+        'status',
+        'at',
+    ]
+
+    def has_add_permission(self, request, obj=None):
+        return False
+
+
+class ArchivedOrderProductInline(admin.TabularInline):
+    model = ArchivedOrderProduct
+    extra = 0
+    can_delete = False
+    readonly_fields = [
+        'product',
+        'product_name',
+        'amount',
+        'price',
+    ]
+
+    def has_add_permission(self, request, obj=None):
+        return False
 
 
 @admin.register(Restaurant)
@@ -34,6 +106,11 @@ class RestaurantAdmin(admin.ModelAdmin):
         'name',
         'address',
         'contact_phone',
+        'capacity',
+        'cooking_minutes',
+    ]
+    raw_id_fields = [
+        'geo',
     ]
     inlines = [
         RestaurantMenuItemInline
@@ -51,6 +128,9 @@ class ProductAdmin(admin.ModelAdmin):
     list_display_links = [
         'name',
     ]
+    list_select_related = [
+        'category',
+    ]
     list_filter = [
         'category',
     ]
@@ -64,8 +144,8 @@ class ProductAdmin(admin.ModelAdmin):
 
     inlines = [
         RestaurantMenuItemInline,
-        OrderProductInline,
     ]
+    orders_preview_size = 10
     fieldsets = (
         ('Общее', {
             'fields': [
@@ -85,16 +165,22 @@ class ProductAdmin(admin.ModelAdmin):
                 'wide'
             ],
         }),
+        ('Заказы', {
+            'fields': [
+                'get_orders_summary',
+            ],
+        }),
     )
 
     readonly_fields = [
         'get_image_preview',
+        'get_orders_summary',
     ]
 
     class Media:
         css = {
             "all": (
-                static("admin/foodcartapp.css")
+                "admin/foodcartapp.css",
             )
         }
 
@@ -103,7 +189,7 @@ class ProductAdmin(admin.ModelAdmin):
             return 'выберите картинку'
         return format_html(
             '<img src="{url}" style="max-height: 200px;"/>',
-            url=obj.image.url
+            url=get_thumbnail_url(obj.image, 400)
         )
     get_image_preview.short_description = 'превью'
 
@@ -115,7 +201,100 @@ class ProductAdmin(admin.ModelAdmin):
             '<a href="{edit_url}"><img src="{src}" style="max-height: 50px;"/>\
              </a>',
             edit_url=edit_url,
-            src=obj.image.url
+            src=get_thumbnail_url(obj.image, 100)
+        )
+    get_image_list_preview.short_description = 'превью'
+
+    def get_orders_summary(self, obj):
+        if not obj.id:
+            return 'заказов нет'
+        order_products = OrderProduct.objects.filter(product=obj)
+        summary = order_products.aggregate(
+            orders_count=Count('id'),
+            amount=Sum('amount'),
+        )
+        if not summary['orders_count']:
+            return 'заказов нет'
+        last_order_ids = (
+            order_products
+            .order_by('-order_id')
+            .values_list('order_id', flat=True)
+            [:self.orders_preview_size]
+        )
+        last_orders = format_html_join(
+            ', ',
+            '<a href="{}">{}</a>',
+            (
+                (
+                    reverse(
+                        'admin:foodcartapp_order_change',
+                        args=(order_id,),
+                    ),
+                    order_id,
+                )
+                for order_id in last_order_ids
+            ),
+        )
+        all_orders_url = reverse('admin:foodcartapp_orderproduct_changelist')
+        return format_html(
+            'Заказов: {orders_count}, штук: {amount}.<br>'
+            'Последние заказы: {last_orders}.<br>'
+            '<a href="{url}?product__id__exact={product_id}">Все заказы</a>',
+            orders_count=summary['orders_count'],
+            amount=summary['amount'],
+            last_orders=last_orders,
+            url=all_orders_url,
+            product_id=obj.id,
+        )
+    get_orders_summary.short_description = 'сводка по заказам'
+
+
+@admin.register(Banner)
+class BannerAdmin(admin.ModelAdmin):
+    list_display = [
+        'get_image_list_preview',
+        'title',
+        'position',
+        'is_active',
+        'starts_at',
+        'ends_at',
+    ]
+    list_display_links = [
+        'title',
+    ]
+    list_editable = [
+        'position',
+        'is_active',
+    ]
+    readonly_fields = [
+        'get_image_preview',
+    ]
+    fields = [
+        'title',
+        'text',
+        'image',
+        'get_image_preview',
+        'position',
+        'is_active',
+        'starts_at',
+        'ends_at',
+    ]
+
+    def get_image_preview(self, obj):
+        if not obj.image:
+            return 'выберите картинку'
+        return format_html(
+            '<img src="{url}" style="max-height: 200px;"/>',
+            url=get_thumbnail_url(obj.image, 400)
+        )
+    get_image_preview.short_description = 'превью'
+
+    def get_image_list_preview(self, obj):
+        if not obj.image:
+            return 'нет картинки'
+        return format_html(
+            '<img src="{src}" style="max-height: 50px;"/>',
+            src=get_thumbnail_url(obj.image, 100)
         )
     get_image_list_preview.short_description = 'превью'
 
@@ -127,10 +306,45 @@ class ProductCategoryAdmin(admin.ModelAdmin):
 
 @admin.register(Order)
 class OrderAdmin(admin.ModelAdmin):
-    inlines = [OrderProductInline,]
+    inlines = [OrderProductInline, OrderStatusEventInline]
+    list_display = [
+        'id',
+        'firstname',
+        'lastname',
+        'phonenumber',
+        'address',
+        'status',
+        'payment',
+        'restaurant',
+        'total_price',
+        'registered_at',
+    ]
+    list_filter = [
+        'status',
+        'payment',
+    ]
+    list_select_related = [
+        'restaurant',
+    ]
+    search_fields = [
+        '=id',
+        '=phonenumber',
+        '^lastname',
+        'address',
+    ]
+    autocomplete_fields = [
+        'restaurant',
+    ]
+    raw_id_fields = [
+        'geo',
+    ]
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
 
     def save_formset(self, request, form, formset, change):
         instances = formset.save(commit=False)
+        for instance in formset.deleted_objects:
+            instance.delete()
         for instance in instances:
             if not instance.price:
                 instance.price = instance.product.price
@@ -155,4 +369,72 @@ class OrderAdmin(admin.ModelAdmin):
 
 @admin.register(OrderProduct)
 class OrderProductAdmin(admin.ModelAdmin):
-    pass
+    list_display = [
+        'order',
+        'product',
+        'amount',
+        'price',
+    ]
+    list_select_related = [
+        'order',
+        'product',
+    ]
+    raw_id_fields = [
+        'order',
+    ]
+    autocomplete_fields = [
+        'product',
+    ]
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+
+@admin.register(OrderGeocodeTask)
+class OrderGeocodeTaskAdmin(admin.ModelAdmin):
+    list_display = [
+        'order',
+        'attempts',
+        'next_attempt_at',
+        'last_error',
+        'failed_at',
+    ]
+    list_filter = [
+        ('failed_at', admin.EmptyFieldListFilter),
+    ]
+    raw_id_fields = [
+        'order',
+    ]
+
+
+@admin.register(ArchivedOrder)
+class ArchivedOrderAdmin(admin.ModelAdmin):
+    inlines = [ArchivedOrderProductInline]
+    list_display = [
+        'id',
+        'firstname',
+        'lastname',
+        'phonenumber',
+        'address',
+        'restaurant',
+        'total_price',
+        'registered_at',
+        'delivered_at',
+    ]
+    list_select_related = [
+        'restaurant',
+    ]
+    search_fields = [
+        '=id',
+        '=phonenumber',
+        'lastname',
+        'address',
+    ]
+    date_hierarchy = 'registered_at'
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
@@ -0,0 +1,83 @@
+from collections import defaultdict
+
+from django.db import transaction
+
+from .models import (
+    ArchivedOrder,
+    ArchivedOrderProduct,
+    Order,
+    OrderProduct,
+    OrderStatusEvent,
+)
+
+
+def archive_orders(orders):
+    """Move orders with their lines and status history to the archive.
+
+    Lines and status events are removed with raw deletes: they are already
+    copied and per-line signals would only recalculate totals of orders
+    that are about to be deleted. Returns number of archived orders.
+    """
+    with transaction.atomic():
+        orders = list(orders.select_for_update())
+        if not orders:
+            return 0
+        order_ids = [order.id for order in orders]
+
+        status_history = defaultdict(list)
+        events = (
+            OrderStatusEvent.objects
+            .filter(order_id__in=order_ids)
+            .order_by('at', 'id')
+            .values_list('order_id', 'status', 'at')
+        )
+        for order_id, status, at in events:
+            status_history[order_id].append({
+                'status': status,
+                'at': at.isoformat(),
+            })
+
+        ArchivedOrder.objects.bulk_create([
+            ArchivedOrder(
+                id=order.id,
+                firstname=order.firstname,
+                lastname=order.lastname,
+                phonenumber=order.phonenumber,
+                address=order.address,
+                status=order.status,
+                payment=order.payment,
+                comment=order.comment,
+                registered_at=order.registered_at,
+                called_at=order.called_at,
+                delivered_at=order.delivered_at,
+                restaurant_id=order.restaurant_id,
+                total_price=order.total_price,
+                items_count=order.items_count,
+                status_history=status_history[order.id],
+            )
+            for order in orders
+        ])
+        order_products = (
+            OrderProduct.objects
+            .filter(order_id__in=order_ids)
+            .select_related('product')
+        )
+        ArchivedOrderProduct.objects.bulk_create([
+            ArchivedOrderProduct(
+                order_id=order_product.order_id,
+                product_id=order_product.product_id,
+                product_name=order_product.product.name,
+                amount=order_product.amount,
+                price=order_product.price,
+            )
+            for order_product in order_products
+        ])
+
+        OrderStatusEvent.objects.filter(order_id__in=order_ids)._raw_delete(
+            OrderStatusEvent.objects.db
+        )
+        OrderProduct.objects.filter(order_id__in=order_ids)._raw_delete(
+            OrderProduct.objects.db
+        )
+        Order.objects.filter(id__in=order_ids).delete()
+    return len(orders)
@@ -0,0 +1,124 @@
+from collections import defaultdict
+
+from django.db import transaction
+
+from star_burger.caching import CacheNamespace
+
+from .menu import invalidate_menu
+from .models import (
+    Product,
+    ProductAvailability,
+    Restaurant,
+    RestaurantMenuItem,
+)
+
+availability_cache = CacheNamespace('availability')
+
+
+def refresh_availability(product_ids=None):
+    """Recompute availability summaries of the products.
+
+    All products are refreshed when `product_ids` is None. Product rows
+    are locked first, so concurrent refreshes of the same products run one
+    after another, and summaries are updated in place instead of being
+    deleted and inserted again.
+    """
+    products = Product.objects.all()
+    menu_items = RestaurantMenuItem.objects.filter(availability=True)
+    if product_ids is not None:
+        products = products.filter(id__in=product_ids)
+        menu_items = menu_items.filter(product_id__in=product_ids)
+
+    with transaction.atomic():
+        locked_product_ids = list(
+            products.select_for_update()
+            .order_by('id')
+            .values_list('id', flat=True)
+        )
+        restaurant_ids = defaultdict(list)
+        for product_id, restaurant_id in menu_items.order_by(
+            'restaurant_id'
+        ).values_list('product_id', 'restaurant_id'):
+            restaurant_ids[product_id].append(restaurant_id)
+
+        summaries = ProductAvailability.objects.in_bulk(locked_product_ids)
+        new_summaries = []
+        changed_summaries = []
+        for product_id in locked_product_ids:
+            summary = summaries.get(product_id)
+            if summary is None:
+                new_summaries.append(ProductAvailability(
+                    product_id=product_id,
+                    restaurant_ids=restaurant_ids[product_id],
+                    restaurants_count=len(restaurant_ids[product_id]),
+                ))
+            elif summary.restaurant_ids != restaurant_ids[product_id]:
+                summary.restaurant_ids = restaurant_ids[product_id]
+                summary.restaurants_count = len(restaurant_ids[product_id])
+                changed_summaries.append(summary)
+        ProductAvailability.objects.bulk_create(new_summaries)
+        ProductAvailability.objects.bulk_update(
+            changed_summaries,
+            ['restaurant_ids', 'restaurants_count'],
+            batch_size=500,
+        )
+    availability_cache.invalidate()
+
+
+def set_availability(available, product_ids=None, restaurant_ids=None):
+    """Switch availability of whole rows or columns of the menu matrix.
+
+    `product_ids` and `restaurant_ids` narrow the change, None stands for
+    all products or all restaurants. Existing menu items are changed with
+    one UPDATE, missing ones are created in bulk when switching on, and
+    summaries and the menu cache are refreshed once after commit, since
+    bulk queries do not send model signals. Returns number of changed
+    menu items.
+    """
+    if product_ids is None and restaurant_ids is None:
+        raise ValueError('Either products or restaurants must be given')
+
+    products = Product.objects.all()
+    restaurants = Restaurant.objects.all()
+    if product_ids is not None:
+        products = products.filter(id__in=product_ids)
+    if restaurant_ids is not None:
+        restaurants = restaurants.filter(id__in=restaurant_ids)
+    product_ids = list(products.values_list('id', flat=True))
+    restaurant_ids = list(restaurants.values_list('id', flat=True))
+
+    with transaction.atomic():
+        menu_items = RestaurantMenuItem.objects.filter(
+            product_id__in=product_ids,
+            restaurant_id__in=restaurant_ids,
+        )
+        changed = menu_items.exclude(availability=available).update(
+            availability=available,
+        )
+        if available:
+            existing = set(
+                menu_items.values_list('product_id', 'restaurant_id')
+            )
+            new_items = [
+                RestaurantMenuItem(
+                    product_id=product_id,
+                    restaurant_id=restaurant_id,
+                    availability=True,
+                )
+                for product_id in product_ids
+                for restaurant_id in restaurant_ids
+                if (product_id, restaurant_id) not in existing
+            ]
+            RestaurantMenuItem.objects.bulk_create(
+                new_items,
+                ignore_conflicts=True,
+            )
+            changed += len(new_items)
+
+        def refresh():
+            refresh_availability(product_ids)
+            invalidate_menu()
+
+        if changed:
+            transaction.on_commit(refresh)
+    return changed
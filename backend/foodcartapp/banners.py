@@ -0,0 +1,74 @@
+import hashlib
+import json
+
+from django.conf import settings
+from django.db.models import Min, Q
+from django.utils import timezone
+
+from star_burger.caching import CacheNamespace
+
+from .models import Banner
+from .thumbnails import get_srcsets
+
+
+BANNERS_CACHE_TIMEOUT = 60 * 60
+
+banners_cache = CacheNamespace('banners', timeout=BANNERS_CACHE_TIMEOUT)
+
+
+def serialize_banner(banner):
+    return {
+        'title': banner.title,
+        'src': banner.image.url,
+        'srcset': get_srcsets(banner.image),
+        'text': banner.text,
+    }
+
+
+def get_seconds_to_next_change(moment):
+    """Return seconds until some banner enters or leaves its window."""
+    boundaries = Banner.objects.filter(is_active=True).aggregate(
+        next_start=Min('starts_at', filter=Q(starts_at__gt=moment)),
+        next_end=Min('ends_at', filter=Q(ends_at__gt=moment)),
+    )
+    next_change = min(
+        [boundary for boundary in boundaries.values() if boundary],
+        default=None,
+    )
+    if next_change is None:
+        return BANNERS_CACHE_TIMEOUT
+    seconds = (next_change - moment).total_seconds()
+    return max(1, min(BANNERS_CACHE_TIMEOUT, int(seconds) + 1))
+
+
+def build_banners():
+    now = timezone.now()
+    content = json.dumps(
+        [serialize_banner(banner) for banner in Banner.objects.shown(now)],
+        ensure_ascii=False,
+        indent=4 if settings.DEBUG else None,
+        separators=None if settings.DEBUG else (',', ':'),
+    ).encode()
+    return {
+        'content': content,
+        'etag': hashlib.md5(content).hexdigest(),
+        'last_modified': now,
+        'timeout': get_seconds_to_next_change(now),
+    }
+
+
+def get_banners():
+    """Return serialized banners shown right now.
+
+    The blob lives in the cache until a banner is saved or until the
+    nearest start or end of a banner display window.
+    """
+    banners = banners_cache.get('shown')
+    if banners is None:
+        banners = build_banners()
+        banners_cache.set('shown', banners, banners['timeout'])
+    return banners
+
+
+def invalidate_banners():
+    banners_cache.invalidate()
@@ -0,0 +1,45 @@
+from .models import OrderProduct
+from .streaming import STREAM_CHUNK_SIZE
+
+
+ORDER_EXPORT_FIELDS = [
+    'id',
+    'firstname',
+    'lastname',
+    'phonenumber',
+    'address',
+    'status',
+    'payment',
+    'restaurant_id',
+    'total_price',
+    'registered_at',
+    'delivered_at',
+]
+
+
+def iter_orders_export(orders):
+    """Yield orders as dicts with their lines, reading both in chunks.
+
+    prefetch_related does not work with iterator(), so orders and lines
+    are read by two queries sorted by order id and merged on the fly. The
+    memory used does not depend on the number of orders.
+    """
+    orders = orders.order_by('id')
+    lines = (
+        OrderProduct.objects
+        .filter(order__in=orders.values('id'))
+        .order_by('order_id', 'id')
+        .values('order_id', 'product_id', 'amount', 'price')
+        .iterator(chunk_size=STREAM_CHUNK_SIZE)
+    )
+    line = next(lines, None)
+    for order in orders.values(*ORDER_EXPORT_FIELDS).iterator(
+        chunk_size=STREAM_CHUNK_SIZE,
+    ):
+        order['phonenumber'] = str(order['phonenumber'])
+        order['products'] = []
+        while line and line['order_id'] <= order['id']:
+            if line.pop('order_id') == order['id']:
+                order['products'].append(line)
+            line = next(lines, None)
+        yield order
@@ -0,0 +1,120 @@
+import logging
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from geocode.geocoder import get_geocode, get_geocodes, normalize_address
+
+from .models import Order, OrderGeocodeTask, Restaurant
+
+
+MAX_ATTEMPTS = 5
+BASE_BACKOFF = timedelta(seconds=30)
+LEASE_TIME = timedelta(minutes=5)
+
+
+def enqueue_geocoding(order):
+    """Queue order for the geocoding worker."""
+    task, created = OrderGeocodeTask.objects.get_or_create(order=order)
+    return task
+
+
+def enqueue_geocoding_many(orders):
+    """Queue orders for the geocoding worker with a single query.
+
+    Orders that already have a task, failed ones included, are skipped.
+    """
+    OrderGeocodeTask.objects.bulk_create(
+        [OrderGeocodeTask(order=order) for order in orders],
+        ignore_conflicts=True,
+    )
+
+
+def geocode_restaurants():
+    """Fill in coordinates of restaurants saved without them.
+
+    Addresses the geocoder can not resolve are cached as negative results,
+    so calling this often does not repeat their requests. Returns number
+    of geocoded restaurants.
+    """
+    restaurants = list(
+        Restaurant.objects
+        .filter(geo__isnull=True)
+        .exclude(address='')
+        .only('id', 'address')
+    )
+    if not restaurants:
+        return 0
+    geos = get_geocodes([restaurant.address for restaurant in restaurants])
+    geocoded = 0
+    for restaurant in restaurants:
+        geo = geos.get(normalize_address(restaurant.address))
+        if geo:
+            restaurant.geo = geo
+            restaurant.save(update_fields=['geo'])
+            geocoded += 1
+    return geocoded
+
+
+def claim_tasks(batch_size):
+    """Lease due tasks so that concurrent workers do not share them."""
+    now = timezone.now()
+    with transaction.atomic():
+        task_ids = list(
+            OrderGeocodeTask.objects
+            .select_for_update(skip_locked=True)
+            .filter(failed_at__isnull=True, next_attempt_at__lte=now)
+            .order_by('next_attempt_at')
+            .values_list('id', flat=True)[:batch_size]
+        )
+        OrderGeocodeTask.objects.filter(id__in=task_ids).update(
+            next_attempt_at=now + LEASE_TIME,
+            attempts=F('attempts') + 1,
+        )
+    return list(
+        OrderGeocodeTask.objects
+        .filter(id__in=task_ids)
+        .select_related('order')
+    )
+
+
+def process_task(task):
+    """Geocode the task's order, rescheduling it on failure.
+
+    After MAX_ATTEMPTS failures the task is kept marked as failed, so the
+    order is not queued again every time the board shows it. Returns True
+    when the order got coordinates.
+    """
+    order = task.order
+    try:
+        geo = get_geocode(order.address)
+    except Exception as error:
+        geo = None
+        task.last_error = str(error)
+    else:
+        task.last_error = '' if geo else 'Адрес не найден'
+
+    if geo:
+        Order.objects.filter(id=order.id).update(
+            geo=geo,
+            updated_at=timezone.now(),
+        )
+        task.delete()
+        logging.info(f'Geo for order {order.id} saved.')
+        return True
+
+    if task.attempts >= MAX_ATTEMPTS:
+        logging.warning(
+            f'Giving up geocoding of order {order.id}: {task.last_error}'
+        )
+        task.failed_at = timezone.now()
+        task.save(update_fields=['failed_at', 'last_error'])
+        return False
+
+    task.next_attempt_at = (
+        timezone.now() + BASE_BACKOFF * 2 ** (task.attempts - 1)
+    )
+    task.save(update_fields=['next_attempt_at', 'last_error'])
+    return False
@@ -0,0 +1,44 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+from django.utils import timezone
+
+from foodcartapp.archive import archive_orders
+from foodcartapp.models import Order
+
+
+class Command(BaseCommand):
+    help = 'Переносит давно выполненные заказы в архив'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days',
+            type=int,
+            default=30,
+            help='Сколько дней выполненный заказ остаётся в рабочей таблице',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='Сколько заказов переносить в одной транзакции',
+        )
+
+    def handle(self, *args, **options):
+        threshold = timezone.now() - timedelta(days=options['days'])
+        completed_orders = Order.objects.filter(
+            Q(delivered_at__lt=threshold)
+            | Q(delivered_at__isnull=True, updated_at__lt=threshold),
+            status='4_ready',
+        ).order_by('id')
+        archived = 0
+        while True:
+            order_ids = list(
+                completed_orders
+                .values_list('id', flat=True)[:options['batch_size']]
+            )
+            if not order_ids:
+                break
+            archived += archive_orders(Order.objects.filter(id__in=order_ids))
+        self.stdout.write(f'Перенесено в архив заказов: {archived}')
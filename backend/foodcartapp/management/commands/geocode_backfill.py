@@ -0,0 +1,75 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from foodcartapp.models import Order, OrderGeocodeTask, Restaurant
+from geocode.geocoder import get_geocodes, normalize_address
+from restaurateur.spatial import bump_index_version
+
+
+BATCH_SIZE = 500
+
+
+class Command(BaseCommand):
+    help = 'Заполняет координаты всех ресторанов и заказов без координат'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=8,
+            help='Сколько запросов к геокодеру выполнять параллельно',
+        )
+        parser.add_argument(
+            '--rate',
+            type=float,
+            default=10,
+            help='Не больше стольких запросов к геокодеру в секунду',
+        )
+
+    def handle(self, *args, **options):
+        restaurants = list(
+            Restaurant.objects
+            .filter(geo__isnull=True)
+            .exclude(address='')
+            .only('id', 'address')
+        )
+        orders = list(
+            Order.objects
+            .filter(geo__isnull=True)
+            .exclude(address='')
+            .only('id', 'address')
+        )
+        places = restaurants + orders
+        geos = get_geocodes(
+            [place.address for place in places],
+            max_workers=options['workers'],
+            rate=options['rate'],
+        )
+
+        now = timezone.now()
+        for place in places:
+            place.geo = geos.get(normalize_address(place.address))
+        for order in orders:
+            order.updated_at = now
+        restaurants = [place for place in restaurants if place.geo]
+        orders = [place for place in orders if place.geo]
+        with transaction.atomic():
+            Restaurant.objects.bulk_update(
+                restaurants,
+                ['geo'],
+                batch_size=BATCH_SIZE,
+            )
+            Order.objects.bulk_update(
+                orders,
+                ['geo', 'updated_at'],
+                batch_size=BATCH_SIZE,
+            )
+            OrderGeocodeTask.objects.filter(order__in=orders).delete()
+        if restaurants:
+            bump_index_version()
+
+        self.stdout.write(
+            f'Адресов: {len(geos)}, ресторанов: {len(restaurants)}, '
+            f'заказов: {len(orders)}'
+        )
@@ -0,0 +1,54 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from foodcartapp.geocoding import (
+    claim_tasks,
+    geocode_restaurants,
+    process_task,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        'Заполняет координаты заказов из очереди геокодирования '
+        'и ресторанов без координат'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=50,
+            help='Сколько задач забирать из очереди за раз',
+        )
+        parser.add_argument(
+            '--sleep',
+            type=float,
+            default=5,
+            help='Пауза в секундах, когда очередь пуста',
+        )
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Обработать очередь один раз и завершиться',
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            restaurants = geocode_restaurants()
+            if restaurants:
+                self.stdout.write(
+                    f'Найдены координаты ресторанов: {restaurants}'
+                )
+            tasks = claim_tasks(options['batch_size'])
+            geocoded = sum(process_task(task) for task in tasks)
+            if tasks:
+                self.stdout.write(
+                    f'Обработано задач: {len(tasks)}, '
+                    f'найдены координаты: {geocoded}'
+                )
+            if options['once'] and not tasks:
+                return
+            if not tasks:
+                time.sleep(options['sleep'])
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from foodcartapp.models import Banner, Product
+from foodcartapp.thumbnails import refresh_thumbnails
+
+
+class Command(BaseCommand):
+    help = 'Создаёт уменьшенные копии картинок товаров и баннеров'
+
+    def handle(self, *args, **options):
+        images = 0
+        for model in [Product, Banner]:
+            for item in model.objects.exclude(image='').only('image'):
+                refresh_thumbnails(item.image)
+                images += 1
+        self.stdout.write(f'Обработано картинок: {images}')
@@ -0,0 +1,45 @@
+from django.core.management.base import BaseCommand
+from django.db.models import F, Q, Sum, Value
+from django.db.models.functions import Coalesce
+
+from foodcartapp.models import Order
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает сохранённые стоимость и количество товаров заказов'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check',
+            action='store_true',
+            help='Только найти заказы с неверными суммами',
+        )
+
+    def handle(self, *args, **options):
+        mismatched_orders = (
+            Order.objects
+            .annotate(
+                actual_price=Coalesce(
+                    Sum(
+                        F('products_inside__price')
+                        * F('products_inside__amount')
+                    ),
+                    Value(0),
+                    output_field=Order._meta.get_field('total_price'),
+                ),
+                actual_count=Coalesce(
+                    Sum('products_inside__amount'),
+                    Value(0),
+                ),
+            )
+            .filter(
+                ~Q(total_price=F('actual_price'))
+                | ~Q(items_count=F('actual_count'))
+            )
+            .values_list('id', flat=True)
+        )
+        order_ids = list(mismatched_orders)
+        self.stdout.write(f'Заказов с неверными суммами: {len(order_ids)}')
+        if order_ids and not options['check']:
+            Order.objects.filter(id__in=order_ids).recalculate_totals()
+            self.stdout.write('Суммы пересчитаны')
@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+
+from foodcartapp.availability import refresh_availability
+from foodcartapp.menu import invalidate_menu
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает сводку наличия товаров по ресторанам'
+
+    def handle(self, *args, **options):
+        refresh_availability()
+        invalidate_menu()
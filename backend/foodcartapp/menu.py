@@ -0,0 +1,55 @@
+import hashlib
+
+from django.utils import timezone
+
+from star_burger.caching import CacheNamespace
+
+from .models import Product
+from .streaming import STREAM_CHUNK_SIZE, iter_json_list
+from .thumbnails import get_srcsets, get_thumbnail_url
+
+
+menu_cache = CacheNamespace('menu', timeout=60 * 60)
+
+
+def serialize_product(product):
+    return {
+        'id': product.id,
+        'name': product.name,
+        'price': product.price,
+        'special_status': product.special_status,
+        'description': product.description,
+        'category': {
+            'id': product.category.id,
+            'name': product.category.name,
+        } if product.category else None,
+        'image': product.image.url,
+        'thumbnail': get_thumbnail_url(product.image, 400),
+        'srcset': get_srcsets(product.image),
+        'restaurant': {
+            'id': product.id,
+            'name': product.name,
+        }
+    }
+
+
+def build_menu():
+    products = Product.objects.select_related('category').available()
+    content = b''.join(iter_json_list(
+        products.iterator(chunk_size=STREAM_CHUNK_SIZE),
+        serialize_product,
+    ))
+    return {
+        'content': content,
+        'etag': hashlib.md5(content).hexdigest(),
+        'last_modified': timezone.now(),
+    }
+
+
+def get_menu():
+    """Return serialized menu, building it only after invalidation."""
+    return menu_cache.get_or_set('products', build_menu)
+
+
+def invalidate_menu():
+    menu_cache.invalidate()
@@ -0,0 +1,25 @@
+# Generated by Django 3.2.15 on 2026-10-18 14:54
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('geocode', '0002_auto_20261018_1754'),
+        ('foodcartapp', '0053_auto_20240831_0049'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='order',
+            name='geo',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='orders', to='geocode.geocode'),
+        ),
+        migrations.AlterField(
+            model_name='restaurant',
+            name='geo',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='restaurants', to='geocode.geocode'),
+        ),
+    ]
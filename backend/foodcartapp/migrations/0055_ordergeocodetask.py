@@ -0,0 +1,30 @@
+# Generated by Django 3.2.15 on 2026-10-18 14:55
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('foodcartapp', '0054_auto_20261018_1754'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OrderGeocodeTask',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('attempts', models.PositiveSmallIntegerField(default=0, verbose_name='Попыток')),
+                ('next_attempt_at', models.DateTimeField(db_index=True, default=django.utils.timezone.now, verbose_name='Следующая попытка')),
+                ('last_error', models.TextField(blank=True, verbose_name='Последняя ошибка')),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Создана')),
+                ('order', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='geocode_task', to='foodcartapp.order', verbose_name='Заказ')),
+            ],
+            options={
+                'verbose_name': 'Задача геокодирования заказа',
+                'verbose_name_plural': 'Задачи геокодирования заказов',
+            },
+        ),
+    ]
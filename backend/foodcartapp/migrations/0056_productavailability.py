@@ -0,0 +1,55 @@
+# Generated by Django 3.2.15 on 2026-10-18 14:59
+
+from collections import defaultdict
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def fill_product_availability(apps, schema_editor):
+    Product = apps.get_model('foodcartapp', 'Product')
+    ProductAvailability = apps.get_model('foodcartapp', 'ProductAvailability')
+    RestaurantMenuItem = apps.get_model('foodcartapp', 'RestaurantMenuItem')
+    restaurant_ids = defaultdict(list)
+    menu_items = (
+        RestaurantMenuItem.objects
+        .filter(availability=True)
+        .order_by('restaurant_id')
+        .values_list('product_id', 'restaurant_id')
+    )
+    for product_id, restaurant_id in menu_items:
+        restaurant_ids[product_id].append(restaurant_id)
+    ProductAvailability.objects.bulk_create([
+        ProductAvailability(
+            product_id=product_id,
+            restaurant_ids=restaurant_ids[product_id],
+            restaurants_count=len(restaurant_ids[product_id]),
+        )
+        for product_id in Product.objects.values_list('id', flat=True)
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('foodcartapp', '0055_ordergeocodetask'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductAvailability',
+            fields=[
+                ('product', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='availability_summary', serialize=False, to='foodcartapp.product', verbose_name='продукт')),
+                ('restaurant_ids', models.JSONField(blank=True, default=list, verbose_name='рестораны, где есть в продаже')),
+                ('restaurants_count', models.PositiveIntegerField(db_index=True, default=0, verbose_name='количество ресторанов')),
+            ],
+            options={
+                'verbose_name': 'наличие товара',
+                'verbose_name_plural': 'наличие товаров',
+            },
+        ),
+        migrations.RunPython(
+            fill_product_availability,
+            migrations.RunPython.noop,
+        ),
+    ]
@@ -0,0 +1,56 @@
+# Generated by Django 3.2.15 on 2026-10-18 15:01
+
+from django.db import migrations, models
+from django.db.models import F, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+
+def set_order_totals(apps, schema_editor):
+    Order = apps.get_model('foodcartapp', 'Order')
+    OrderProduct = apps.get_model('foodcartapp', 'OrderProduct')
+    lines = (
+        OrderProduct.objects
+        .filter(order=OuterRef('pk'))
+        .values('order')
+    )
+    Order.objects.update(
+        total_price=Coalesce(
+            Subquery(
+                lines
+                .annotate(total=Sum(F('price') * F('amount')))
+                .values('total'),
+                output_field=models.DecimalField(),
+            ),
+            Value(0),
+            output_field=models.DecimalField(),
+        ),
+        items_count=Coalesce(
+            Subquery(
+                lines.annotate(count=Sum('amount')).values('count'),
+                output_field=models.IntegerField(),
+            ),
+            Value(0),
+            output_field=models.IntegerField(),
+        ),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('foodcartapp', '0057_idempotencykey'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='items_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Количество товаров'),
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='total_price',
+            field=models.DecimalField(decimal_places=2, default=0, editable=False, max_digits=10, verbose_name='Стоимость заказа'),
+        ),
+        migrations.RunPython(set_order_totals, migrations.RunPython.noop),
+    ]
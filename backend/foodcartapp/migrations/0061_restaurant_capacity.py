@@ -0,0 +1,24 @@
+# Generated by Django 3.2.15 on 2026-10-18 15:05
+
+import django.core.validators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('foodcartapp', '0060_order_updated_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='restaurant',
+            name='capacity',
+            field=models.PositiveSmallIntegerField(default=5, validators=[django.core.validators.MinValueValidator(1)], verbose_name='заказов готовится одновременно'),
+        ),
+        migrations.AddField(
+            model_name='restaurant',
+            name='cooking_minutes',
+            field=models.PositiveSmallIntegerField(default=20, validators=[django.core.validators.MinValueValidator(1)], verbose_name='минут на приготовление заказа'),
+        ),
+    ]
@@ -0,0 +1,64 @@
+# Generated by Django 3.2.15 on 2026-10-18 15:06
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+def create_status_events(apps, schema_editor):
+    Order = apps.get_model('foodcartapp', 'Order')
+    OrderStatusEvent = apps.get_model('foodcartapp', 'OrderStatusEvent')
+    events = []
+    for order in Order.objects.iterator():
+        events.append(OrderStatusEvent(
+            order_id=order.id,
+            status='1_manager',
+            at=order.registered_at,
+        ))
+        if order.status and order.status != '1_manager':
+            events.append(OrderStatusEvent(
+                order_id=order.id,
+                status=order.status,
+                at=order.delivered_at or order.called_at or order.updated_at,
+            ))
+    OrderStatusEvent.objects.bulk_create(events, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('foodcartapp', '0061_restaurant_capacity'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='order',
+            name='status',
+            field=models.CharField(choices=[('1_manager', 'Обработка заказа'), ('2_cooking', 'Приготовление заказа'), ('3_delivery', 'Доставка заказа'), ('4_ready', 'Готово')], db_index=True, default='1_manager', max_length=100, verbose_name='Статус заказа'),
+        ),
+        migrations.CreateModel(
+            name='OrderStatusEvent',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('1_manager', 'Обработка заказа'), ('2_cooking', 'Приготовление заказа'), ('3_delivery', 'Доставка заказа'), ('4_ready', 'Готово')], max_length=100, verbose_name='Статус заказа')),
+                ('at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Время')),
+                ('order', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='status_events', to='foodcartapp.order', verbose_name='Заказ')),
+            ],
+            options={
+                'verbose_name': 'Смена статуса заказа',
+                'verbose_name_plural': 'Смены статусов заказов',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='orderstatusevent',
+            index=models.Index(fields=['status', 'at'], name='order_status_event_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='orderstatusevent',
+            index=models.Index(fields=['order', 'status'], name='order_status_event_order_idx'),
+        ),
+        migrations.RunPython(
+            create_status_events,
+            migrations.RunPython.noop,
+        ),
+    ]
@@ -0,0 +1,56 @@
+# Generated by Django 3.2.15 on 2026-10-18 15:07
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+import phonenumber_field.modelfields
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('foodcartapp', '0062_orderstatusevent'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedOrder',
+            fields=[
+                ('id', models.IntegerField(primary_key=True, serialize=False, verbose_name='ID заказа')),
+                ('firstname', models.CharField(max_length=50, verbose_name='Имя')),
+                ('lastname', models.CharField(blank=True, max_length=50, verbose_name='Фамилия')),
+                ('phonenumber', phonenumber_field.modelfields.PhoneNumberField(max_length=128, region='RU')),
+                ('address', models.CharField(blank=True, max_length=200, verbose_name='Адрес')),
+                ('status', models.CharField(choices=[('1_manager', 'Обработка заказа'), ('2_cooking', 'Приготовление заказа'), ('3_delivery', 'Доставка заказа'), ('4_ready', 'Готово')], max_length=100, verbose_name='Статус заказа')),
+                ('payment', models.CharField(choices=[('online', 'Онлайн на сайте'), ('card', 'Картой курьеру'), ('cash', 'Наличными курьеру')], max_length=100, verbose_name='Способ оплаты')),
+                ('comment', models.TextField(blank=True, verbose_name='Комментарий')),
+                ('registered_at', models.DateTimeField(db_index=True, verbose_name='Зарегестрирован')),
+                ('called_at', models.DateTimeField(blank=True, null=True, verbose_name='Время звонка')),
+                ('delivered_at', models.DateTimeField(blank=True, null=True, verbose_name='Время доставки')),
+                ('total_price', models.DecimalField(decimal_places=2, max_digits=10, verbose_name='Стоимость заказа')),
+                ('items_count', models.PositiveIntegerField(verbose_name='Количество товаров')),
+                ('status_history', models.JSONField(default=list, verbose_name='История статусов')),
+                ('archived_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='В архиве с')),
+                ('restaurant', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='archived_orders', to='foodcartapp.restaurant', verbose_name='Где готовился')),
+            ],
+            options={
+                'verbose_name': 'Архивный заказ',
+                'verbose_name_plural': 'Архивные заказы',
+            },
+        ),
+        migrations.CreateModel(
+            name='ArchivedOrderProduct',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('product_name', models.CharField(max_length=50, verbose_name='Название товара')),
+                ('amount', models.SmallIntegerField(verbose_name='Количество')),
+                ('price', models.DecimalField(blank=True, decimal_places=2, max_digits=8, null=True, verbose_name='цена')),
+                ('order', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='products_inside', to='foodcartapp.archivedorder')),
+                ('product', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='archived_orders', to='foodcartapp.product')),
+            ],
+            options={
+                'verbose_name': 'Продукт в архивном заказе',
+                'verbose_name_plural': 'Продукты в архивных заказах',
+            },
+        ),
+    ]
@@ -0,0 +1,63 @@
+# Generated by Django 3.2.15 on 2026-10-18 15:15
+
+import os
+
+from django.conf import settings
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.db import migrations, models
+
+
+INITIAL_BANNERS = [
+    ('Burger', 'Tasty Burger at your door step', 'burger.jpg'),
+    ('Spices', 'All Cuisines', 'food.jpg'),
+    ('New York', 'Food is incomplete without a tasty dessert', 'tasty.jpg'),
+]
+
+
+def create_banners(apps, schema_editor):
+    Banner = apps.get_model('foodcartapp', 'Banner')
+    banners = []
+    for position, (title, text, image) in enumerate(INITIAL_BANNERS):
+        if not default_storage.exists(image):
+            path = os.path.join(settings.BASE_DIR, 'assets', image)
+            if not os.path.exists(path):
+                continue
+            with open(path, 'rb') as image_file:
+                image = default_storage.save(image, File(image_file))
+        banners.append(Banner(
+            title=title,
+            text=text,
+            image=image,
+            position=position,
+        ))
+    Banner.objects.bulk_create(banners)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('foodcartapp', '0064_updated_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Banner',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('title', models.CharField(max_length=50, verbose_name='заголовок')),
+                ('text', models.CharField(blank=True, max_length=200, verbose_name='текст')),
+                ('image', models.ImageField(upload_to='', verbose_name='картинка')),
+                ('position', models.PositiveSmallIntegerField(db_index=True, default=0, verbose_name='порядок')),
+                ('is_active', models.BooleanField(default=True, verbose_name='показывать')),
+                ('starts_at', models.DateTimeField(blank=True, null=True, verbose_name='показывать с')),
+                ('ends_at', models.DateTimeField(blank=True, null=True, verbose_name='показывать до')),
+            ],
+            options={
+                'verbose_name': 'баннер',
+                'verbose_name_plural': 'баннеры',
+                'ordering': ['position', 'id'],
+            },
+        ),
+        migrations.RunPython(create_banners, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,53 @@
+# Generated by Django 3.2.15 on 2026-10-18 15:39
+
+from django.db import migrations
+import phonenumber_field.modelfields
+
+
+# Order admin searches lastname with istartswith and address with
+# icontains, which PostgreSQL runs as UPPER(column::text) LIKE UPPER(...).
+# Only expression indexes with pattern and trigram operator classes can
+# serve these lookups, so they are created with raw SQL on PostgreSQL.
+SEARCH_INDEXES = [
+    (
+        'order_lastname_upper_idx',
+        'CREATE INDEX IF NOT EXISTS order_lastname_upper_idx '
+        'ON foodcartapp_order (UPPER(lastname::text) text_pattern_ops)',
+    ),
+    (
+        'order_address_trgm_idx',
+        'CREATE INDEX IF NOT EXISTS order_address_trgm_idx '
+        'ON foodcartapp_order USING gin (UPPER(address::text) gin_trgm_ops)',
+    ),
+]
+
+
+def create_search_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    for _, sql in SEARCH_INDEXES:
+        schema_editor.execute(sql)
+
+
+def drop_search_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for name, _ in SEARCH_INDEXES:
+        schema_editor.execute(f'DROP INDEX IF EXISTS {name}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('foodcartapp', '0066_idempotencykey_request_hash'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='order',
+            name='phonenumber',
+            field=phonenumber_field.modelfields.PhoneNumberField(db_index=True, max_length=128, region='RU'),
+        ),
+        migrations.RunPython(create_search_indexes, drop_search_indexes),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 3.2.15 on 2026-10-18 15:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('foodcartapp', '0067_order_search_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ordergeocodetask',
+            name='failed_at',
+            field=models.DateTimeField(blank=True, help_text='Задача больше не выполняется. Удалите её, чтобы начать попытки заново', null=True, verbose_name='Попытки закончились'),
+        ),
+    ]
@@ -1,5 +1,15 @@
-from django.db import models
-from django.db.models import F, Sum
+from django.core.exceptions import ValidationError
+from django.db import models, transaction
+from django.db.models import (
+    ExpressionWrapper,
+    F,
+    OuterRef,
+    Q,
+    Subquery,
+    Sum,
+    Value,
+)
+from django.db.models.functions import Coalesce
 from django.core.validators import MinValueValidator
 from django.utils import timezone
 from phonenumber_field.modelfields import PhoneNumberField
@@ -22,13 +32,27 @@ class Restaurant(models.Model):
         max_length=50,
         blank=True,
     )
-    geo = models.OneToOneField(
+    capacity = models.PositiveSmallIntegerField(
+        'заказов готовится одновременно',
+        default=5,
+        validators=[MinValueValidator(1)],
+    )
+    cooking_minutes = models.PositiveSmallIntegerField(
+        'минут на приготовление заказа',
+        default=20,
+        validators=[MinValueValidator(1)],
+    )
+    geo = models.ForeignKey(
         GeoCode,
         on_delete=models.SET_NULL,
-        related_name='restaurant',
+        related_name='restaurants',
         blank=True,
         null=True,
     )
+    updated_at = models.DateTimeField(
+        'изменён',
+        auto_now=True,
+    )
 
     class Meta:
         verbose_name = 'ресторан'
@@ -40,12 +64,7 @@ class Restaurant(models.Model):
 
 class ProductQuerySet(models.QuerySet):
     def available(self):
-        products = (
-            RestaurantMenuItem.objects
-            .filter(availability=True)
-            .values_list('product')
-        )
-        return self.filter(pk__in=products)
+        return self.filter(availability_summary__restaurants_count__gt=0)
 
 
 class ProductCategory(models.Model):
@@ -94,6 +113,10 @@ class Product(models.Model):
         max_length=200,
         blank=True,
     )
+    updated_at = models.DateTimeField(
+        'изменён',
+        auto_now=True,
+    )
 
     objects = ProductQuerySet.as_manager()
 
@@ -135,15 +158,147 @@ class RestaurantMenuItem(models.Model):
         return f"{self.restaurant.name} - {self.product.name}"
 
 
+class ProductAvailability(models.Model):
+    product = models.OneToOneField(
+        Product,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='availability_summary',
+        verbose_name='продукт',
+    )
+    restaurant_ids = models.JSONField(
+        'рестораны, где есть в продаже',
+        default=list,
+        blank=True,
+    )
+    restaurants_count = models.PositiveIntegerField(
+        'количество ресторанов',
+        default=0,
+        db_index=True,
+    )
+
+    class Meta:
+        verbose_name = 'наличие товара'
+        verbose_name_plural = 'наличие товаров'
+
+    def __str__(self):
+        return f"{self.product_id}: {self.restaurants_count}"
+
+
+class BannerQuerySet(models.QuerySet):
+    def shown(self, moment=None):
+        """Banners that are switched on and inside their display window."""
+        moment = moment or timezone.now()
+        return self.filter(
+            Q(starts_at__isnull=True) | Q(starts_at__lte=moment),
+            Q(ends_at__isnull=True) | Q(ends_at__gt=moment),
+            is_active=True,
+        )
+
+
+class Banner(models.Model):
+    title = models.CharField(
+        'заголовок',
+        max_length=50,
+    )
+    text = models.CharField(
+        'текст',
+        max_length=200,
+        blank=True,
+    )
+    image = models.ImageField(
+        'картинка',
+    )
+    position = models.PositiveSmallIntegerField(
+        'порядок',
+        default=0,
+        db_index=True,
+    )
+    is_active = models.BooleanField(
+        'показывать',
+        default=True,
+    )
+    starts_at = models.DateTimeField(
+        'показывать с',
+        blank=True,
+        null=True,
+    )
+    ends_at = models.DateTimeField(
+        'показывать до',
+        blank=True,
+        null=True,
+    )
+
+    objects = BannerQuerySet.as_manager()
+
+    class Meta:
+        verbose_name = 'баннер'
+        verbose_name_plural = 'баннеры'
+        ordering = ['position', 'id']
+
+    def __str__(self):
+        return self.title
+
+
 class OrderQuerySet(models.QuerySet):
     def in_process(self):
         return self.exclude(status='4_ready')
 
-    def add_total_price(self):
-        return self.annotate(
-            total_price=Sum(
-                F('products_inside__price') * F('products_inside__amount')
+    def change_status(self, status, **fields):
+        """Move orders that may reach status there and record the events.
+
+        Orders for which the transition is not allowed are skipped.
+        Returns number of moved orders.
+        """
+        sources = [
+            source for source, targets in Order.STATUS_TRANSITIONS.items()
+            if status in targets
+        ]
+        now = timezone.now()
+        with transaction.atomic():
+            order_ids = list(
+                self.select_for_update()
+                .filter(status__in=sources)
+                .values_list('id', flat=True)
+            )
+            self.model.objects.filter(id__in=order_ids).update(
+                status=status,
+                updated_at=now,
+                **fields,
             )
+            OrderStatusEvent.objects.bulk_create([
+                OrderStatusEvent(order_id=order_id, status=status, at=now)
+                for order_id in order_ids
+            ])
+        return len(order_ids)
+
+    def recalculate_totals(self):
+        """Store sums of order lines in total_price and items_count."""
+        lines = OrderProduct.objects.filter(order=OuterRef('pk'))
+        return self.update(
+            updated_at=timezone.now(),
+            total_price=Coalesce(
+                Subquery(
+                    lines
+                    .values('order')
+                    .annotate(total=Sum(F('price') * F('amount')))
+                    .values('total'),
+                    output_field=models.DecimalField(),
+                ),
+                Value(0),
+                output_field=models.DecimalField(),
+            ),
+            items_count=Coalesce(
+                Subquery(
+                    lines
+                    .values('order')
+                    .annotate(count=Sum('amount'))
+                    .values('count'),
+                    output_field=models.IntegerField(),
+                ),
+                Value(0),
+                output_field=models.IntegerField(),
+            ),
         )
 
 
@@ -154,6 +309,13 @@ class Order(models.Model):
         ('3_delivery', 'Доставка заказа'),
         ('4_ready', 'Готово'),
     ]
+    STATUS_TRANSITIONS = {
+        '1_manager': {'2_cooking'},
+        '2_cooking': {'3_delivery'},
+        '3_delivery': {'4_ready'},
+        '4_ready': set(),
+    }
+    TOTAL_FIELDS = ['total_price', 'items_count']
     PAYMENT = [
         ('online', 'Онлайн на сайте'),
         ('card', 'Картой курьеру'),
@@ -161,7 +323,7 @@ class Order(models.Model):
     ]
     firstname = models.CharField('Имя', max_length=50)
     lastname = models.CharField('Фамилия', max_length=50, blank=True)
-    phonenumber = PhoneNumberField(region='RU')
+    phonenumber = PhoneNumberField(region='RU', db_index=True)
     address = models.CharField('Адрес', max_length=200, blank=True)
     products = models.ManyToManyField(
         Product,
@@ -172,6 +334,7 @@ class Order(models.Model):
         'Статус заказа',
         max_length=100,
         choices=ORDER_STATUS,
+        default='1_manager',
         db_index=True,
     )
     comment = models.TextField(
@@ -183,6 +346,11 @@ class Order(models.Model):
         'Зарегестрирован',
         default=timezone.now,
         db_index=True)
+    updated_at = models.DateTimeField(
+        'Изменён',
+        auto_now=True,
+        db_index=True,
+    )
     called_at = models.DateTimeField(
         'Время звонка',
         blank=True,
@@ -207,10 +375,22 @@ class Order(models.Model):
         blank=True,
         null=True,
     )
-    geo = models.OneToOneField(
+    total_price = models.DecimalField(
+        'Стоимость заказа',
+        max_digits=10,
+        decimal_places=2,
+        default=0,
+        editable=False,
+    )
+    items_count = models.PositiveIntegerField(
+        'Количество товаров',
+        default=0,
+        editable=False,
+    )
+    geo = models.ForeignKey(
         GeoCode,
         on_delete=models.SET_NULL,
-        related_name='order',
+        related_name='orders',
         blank=True,
         null=True,
     )
@@ -220,10 +400,122 @@ class Order(models.Model):
     class Meta:
         verbose_name = 'Заказ'
         verbose_name_plural = 'Заказы'
+        indexes = [
+            models.Index(
+                fields=['status', 'registered_at', 'id'],
+                name='order_board_idx',
+            ),
+        ]
 
     def __str__(self):
         return f"Заказ {self.id}"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        order = super().from_db(db, field_names, values)
+        order._loaded_status = order.__dict__.get('status')
+        return order
+
+    def clean(self):
+        super().clean()
+        loaded_status = getattr(self, '_loaded_status', None)
+        if self._state.adding:
+            if self.status != '1_manager':
+                raise ValidationError({
+                    'status': 'Новый заказ должен начинаться с обработки',
+                })
+        elif (
+            loaded_status is not None
+            and self.status != loaded_status
+            and self.status not in self.STATUS_TRANSITIONS[loaded_status]
+        ):
+            raise ValidationError({
+                'status': (
+                    f'Нельзя перевести заказ из статуса '
+                    f'«{dict(self.ORDER_STATUS)[loaded_status]}» в '
+                    f'«{self.get_status_display()}»'
+                ),
+            })
+
+    def save(self, *args, **kwargs):
+        loaded_status = getattr(self, '_loaded_status', None)
+        status_changed = self._state.adding or (
+            loaded_status is not None and self.status != loaded_status
+        )
+        if status_changed:
+            self.clean()
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            # Totals are kept by recalculate_totals(), values loaded with
+            # the order may already be stale.
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key
+                and field.name not in self.TOTAL_FIELDS
+            ]
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            if status_changed:
+                OrderStatusEvent.objects.create(order=self, status=self.status)
+        self._loaded_status = self.status
+
+
+class OrderStatusEventQuerySet(models.QuerySet):
+    def stage_durations(self, from_status, to_status):
+        """Annotate orders' events of to_status with time since from_status.
+
+        Used for SLA reports, e.g. cooking time is the duration between
+        '2_cooking' and '3_delivery'.
+        """
+        started_at = (
+            OrderStatusEvent.objects
+            .filter(order=OuterRef('order'), status=from_status)
+            .order_by('-at')
+            .values('at')[:1]
+        )
+        return (
+            self.filter(status=to_status)
+            .annotate(started_at=Subquery(started_at))
+            .exclude(started_at__isnull=True)
+            .annotate(duration=ExpressionWrapper(
+                F('at') - F('started_at'),
+                output_field=models.DurationField(),
+            ))
+        )
+
+
+class OrderStatusEvent(models.Model):
+    order = models.ForeignKey(
+        Order,
+        on_delete=models.CASCADE,
+        related_name='status_events',
+        verbose_name='Заказ',
+    )
+    status = models.CharField(
+        'Статус заказа',
+        max_length=100,
+        choices=Order.ORDER_STATUS,
+    )
+    at = models.DateTimeField('Время', default=timezone.now)
+
+    objects = OrderStatusEventQuerySet.as_manager()
+
+    class Meta:
+        verbose_name = 'Смена статуса заказа'
+        verbose_name_plural = 'Смены статусов заказов'
+        indexes = [
+            models.Index(
+                fields=['status', 'at'],
+                name='order_status_event_idx',
+            ),
+            models.Index(
+                fields=['order', 'status'],
+                name='order_status_event_order_idx',
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.order_id}: {self.get_status_display()}"
+
 
 class OrderProduct(models.Model):
     order = models.ForeignKey(
@@ -261,3 +553,143 @@ class OrderProduct(models.Model):
 
     def __str__(self):
         return f"{self.product} в заказе {self.order.id}"
+
+
+class OrderGeocodeTask(models.Model):
+    order = models.OneToOneField(
+        Order,
+        on_delete=models.CASCADE,
+        related_name='geocode_task',
+        verbose_name='Заказ',
+    )
+    attempts = models.PositiveSmallIntegerField('Попыток', default=0)
+    next_attempt_at = models.DateTimeField(
+        'Следующая попытка',
+        default=timezone.now,
+        db_index=True,
+    )
+    last_error = models.TextField('Последняя ошибка', blank=True)
+    failed_at = models.DateTimeField(
+        'Попытки закончились',
+        null=True,
+        blank=True,
+        help_text='Задача больше не выполняется. Удалите её, чтобы '
+                  'начать попытки заново',
+    )
+    created_at = models.DateTimeField('Создана', default=timezone.now)
+
+    class Meta:
+        verbose_name = 'Задача геокодирования заказа'
+        verbose_name_plural = 'Задачи геокодирования заказов'
+
+    def __str__(self):
+        return f"Геокодирование заказа {self.order_id}"
+
+
+class IdempotencyKey(models.Model):
+    key = models.CharField('Ключ', max_length=255, unique=True)
+    order = models.ForeignKey(
+        Order,
+        on_delete=models.CASCADE,
+        related_name='idempotency_keys',
+        verbose_name='Заказ',
+    )
+    request_hash = models.CharField(
+        'Хэш запроса',
+        max_length=64,
+        blank=True,
+    )
+    response = models.JSONField('Ответ')
+    status_code = models.PositiveSmallIntegerField('Код ответа')
+    created_at = models.DateTimeField(
+        'Создан',
+        default=timezone.now,
+        db_index=True,
+    )
+
+    class Meta:
+        verbose_name = 'Ключ идемпотентности'
+        verbose_name_plural = 'Ключи идемпотентности'
+
+    def __str__(self):
+        return self.key
+
+
+class ArchivedOrder(models.Model):
+    id = models.IntegerField('ID заказа', primary_key=True)
+    firstname = models.CharField('Имя', max_length=50)
+    lastname = models.CharField('Фамилия', max_length=50, blank=True)
+    phonenumber = PhoneNumberField(region='RU')
+    address = models.CharField('Адрес', max_length=200, blank=True)
+    status = models.CharField(
+        'Статус заказа',
+        max_length=100,
+        choices=Order.ORDER_STATUS,
+    )
+    payment = models.CharField(
+        'Способ оплаты',
+        max_length=100,
+        choices=Order.PAYMENT,
+    )
+    comment = models.TextField('Комментарий', blank=True)
+    registered_at = models.DateTimeField('Зарегестрирован', db_index=True)
+    called_at = models.DateTimeField('Время звонка', blank=True, null=True)
+    delivered_at = models.DateTimeField(
+        'Время доставки',
+        blank=True,
+        null=True,
+    )
+    restaurant = models.ForeignKey(
+        Restaurant,
+        on_delete=models.SET_NULL,
+        related_name='archived_orders',
+        verbose_name='Где готовился',
+        blank=True,
+        null=True,
+    )
+    total_price = models.DecimalField(
+        'Стоимость заказа',
+        max_digits=10,
+        decimal_places=2,
+    )
+    items_count = models.PositiveIntegerField('Количество товаров')
+    status_history = models.JSONField('История статусов', default=list)
+    archived_at = models.DateTimeField('В архиве с', default=timezone.now)
+
+    class Meta:
+        verbose_name = 'Архивный заказ'
+        verbose_name_plural = 'Архивные заказы'
+
+    def __str__(self):
+        return f"Архивный заказ {self.id}"
+
+
+class ArchivedOrderProduct(models.Model):
+    order = models.ForeignKey(
+        ArchivedOrder,
+        related_name='products_inside',
+        on_delete=models.CASCADE,
+    )
+    product = models.ForeignKey(
+        Product,
+        related_name='archived_orders',
+        on_delete=models.SET_NULL,
+        blank=True,
+        null=True,
+    )
+    product_name = models.CharField('Название товара', max_length=50)
+    amount = models.SmallIntegerField('Количество')
+    price = models.DecimalField(
+        'цена',
+        max_digits=8,
+        decimal_places=2,
+        blank=True,
+        null=True,
+    )
+
+    class Meta:
+        verbose_name = 'Продукт в архивном заказе'
+        verbose_name_plural = 'Продукты в архивных заказах'
+
+    def __str__(self):
+        return f"{self.product_name} в заказе {self.order_id}"
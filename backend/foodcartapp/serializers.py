@@ -1,13 +1,11 @@
 import logging
 
 from django.db import transaction
-from django.shortcuts import get_object_or_404
 from environs import Env
 from rest_framework import serializers
 
+from foodcartapp.geocoding import enqueue_geocoding
 from foodcartapp.models import Order, OrderProduct, Product
-from geocode.models import GeoCode
-from restaurateur.views import fetch_coordinates
 
 
 env = Env()
@@ -15,7 +13,7 @@ env.read_env()
 
 
 class OrderProductSerializer(serializers.ModelSerializer):
-    product = serializers.PrimaryKeyRelatedField(read_only=True)
+    product = serializers.IntegerField()
     quantity = serializers.IntegerField(source='amount', min_value=1)
 
     class Meta:
@@ -34,49 +32,58 @@ class OrderSerializer(serializers.ModelSerializer):
         model = Order
         fields = '__all__'
         extra_fields = ['id',]
+        read_only_fields = [
+            'status',
+            'restaurant',
+            'geo',
+            'registered_at',
+            'called_at',
+            'delivered_at',
+        ]
 
-    @transaction.atomic
-    def create(self, validated_data):
-        order, created = Order.objects.get_or_create(
-            phonenumber=validated_data['phonenumber'],
-            defaults={
-                'firstname': validated_data['firstname'],
-                'lastname': validated_data['lastname'],
-                'address': validated_data['address']
-            }
-        )
-        if created:
-            logging.info(f'Order {order.id} is created')
-            products = validated_data['products']
-            for product_details in products:
-                product = get_object_or_404(
-                    Product, id=product_details['product']
-                )
-                product_in_order, created = OrderProduct.objects.get_or_create(
-                    product=product,
-                    order=order,
-                    amount=product_details['amount'],
-                    price=product_details.get('price', product.price)
-                )
-                if created:
-                    logging.info(
-                        f'{product_in_order.product.name} added to order '
-                        f'{product_in_order.order.id}'
-                    )
-
-        order_lon, order_lat = fetch_coordinates(
-            env.str('YANDEX_API_KEY'),
-            order.address,
+    def validate_products(self, products):
+        """Resolve all cart products with one query and merge duplicates."""
+        catalog = Product.objects.in_bulk(
+            {product_details['product'] for product_details in products}
         )
-        geo, created = GeoCode.objects.get_or_create(
-            address=order.address,
-            lon=order_lon,
-            lat=order_lat,
+        unknown_ids = sorted(
+            {product_details['product'] for product_details in products}
+            - set(catalog)
         )
-        if created:
-            logging.info(f'Geo for order {order.id} created.')
+        if unknown_ids:
+            raise serializers.ValidationError(
+                f'Неизвестные товары: {", ".join(map(str, unknown_ids))}'
+            )
+
+        amounts = {}
+        for product_details in products:
+            product_id = product_details['product']
+            amounts[product_id] = (
+                amounts.get(product_id, 0) + product_details['amount']
+            )
+        return [
+            {'product': catalog[product_id], 'amount': amount}
+            for product_id, amount in amounts.items()
+        ]
+
+    @transaction.atomic
+    def create(self, validated_data):
+        products = validated_data.pop('products')
+        order = Order.objects.create(**validated_data)
+        logging.info(f'Order {order.id} is created')
+        OrderProduct.objects.bulk_create([
+            OrderProduct(
+                order=order,
+                product=product_details['product'],
+                amount=product_details['amount'],
+                price=product_details['product'].price,
+            )
+            for product_details in products
+        ])
+        logging.info(f'{len(products)} products added to order {order.id}')
+        Order.objects.filter(id=order.id).recalculate_totals()
+        order.refresh_from_db(fields=['total_price', 'items_count'])
 
-        order.geo = geo
-        order.save()
+        enqueue_geocoding(order)
 
         return order
@@ -0,0 +1,52 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .availability import refresh_availability
+from .banners import invalidate_banners
+from .menu import invalidate_menu
+from .models import (
+    Banner,
+    Order,
+    OrderProduct,
+    Product,
+    ProductCategory,
+    RestaurantMenuItem,
+)
+from .thumbnails import refresh_thumbnails
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+@receiver(post_save, sender=ProductCategory)
+@receiver(post_delete, sender=ProductCategory)
+def reset_menu_cache(sender, **kwargs):
+    transaction.on_commit(invalidate_menu)
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_save, sender=Banner)
+def make_thumbnails(sender, instance, **kwargs):
+    transaction.on_commit(lambda: refresh_thumbnails(instance.image))
+
+
+@receiver(post_save, sender=Banner)
+@receiver(post_delete, sender=Banner)
+def reset_banners_cache(sender, **kwargs):
+    transaction.on_commit(invalidate_banners)
+
+
+@receiver(post_save, sender=RestaurantMenuItem)
+@receiver(post_delete, sender=RestaurantMenuItem)
+def update_product_availability(sender, instance, **kwargs):
+    def refresh():
+        refresh_availability([instance.product_id])
+        invalidate_menu()
+
+    transaction.on_commit(refresh)
+
+
+@receiver(post_save, sender=OrderProduct)
+@receiver(post_delete, sender=OrderProduct)
+def update_order_totals(sender, instance, **kwargs):
+    Order.objects.filter(id=instance.order_id).recalculate_totals()
@@ -0,0 +1,74 @@
+import json
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import StreamingHttpResponse
+from environs import Env
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+env = Env()
+env.read_env()
+
+STREAM_CHUNK_SIZE = env.int('STREAM_CHUNK_SIZE', 2000)
+STREAM_BUFFER_SIZE = 64 * 1024
+
+django_encoder = DjangoJSONEncoder()
+
+
+def dumps(value):
+    """Serialize value to compact JSON bytes, with orjson when installed.
+
+    Decimals and datetimes are passed to DjangoJSONEncoder, so both
+    encoders give the same output for model fields.
+    """
+    if orjson:
+        return orjson.dumps(
+            value,
+            default=django_encoder.default,
+            option=orjson.OPT_PASSTHROUGH_DATETIME,
+        )
+    return json.dumps(
+        value,
+        cls=DjangoJSONEncoder,
+        ensure_ascii=False,
+        separators=(',', ':'),
+    ).encode()
+
+
+def iter_json_list(items, serialize):
+    """Yield a JSON array of serialized items in chunks of bytes.
+
+    Items are encoded one by one and glued into chunks of about
+    STREAM_BUFFER_SIZE bytes, so only one chunk is kept in memory and
+    the first bytes are sent before the last item is read from database.
+    """
+    buffer = [b'[']
+    buffered = 1
+    for number, item in enumerate(items):
+        if number:
+            buffer.append(b',')
+        content = dumps(serialize(item))
+        buffer.append(content)
+        buffered += len(content) + 1
+        if buffered >= STREAM_BUFFER_SIZE:
+            yield b''.join(buffer)
+            buffer = []
+            buffered = 0
+    buffer.append(b']')
+    yield b''.join(buffer)
+
+
+def stream_json_list(items, serialize):
+    """Return a streaming response with a JSON array of the items.
+
+    Pass `queryset.iterator(chunk_size=STREAM_CHUNK_SIZE)` as items to
+    keep memory flat for big tables.
+    """
+    return StreamingHttpResponse(
+        iter_json_list(items, serialize),
+        content_type='application/json',
+    )
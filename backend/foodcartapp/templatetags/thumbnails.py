@@ -0,0 +1,12 @@
+from django import template
+
+from foodcartapp.thumbnails import get_thumbnail_url
+
+
+register = template.Library()
+
+
+@register.filter
+def thumbnail(image, width):
+    """Return URL of the image thumbnail at least `width` pixels wide."""
+    return get_thumbnail_url(image, int(width))
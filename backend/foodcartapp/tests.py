@@ -0,0 +1,666 @@
+import hashlib
+import tempfile
+from datetime import timedelta
+from io import BytesIO, StringIO
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.exceptions import ValidationError
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from PIL import Image
+
+from geocode.geocoder import geocode_cache, shared_geocode_cache
+from geocode.models import GeoCode
+from restaurateur.spatial import restaurant_index
+
+from . import views
+from .availability import refresh_availability
+from .banners import banners_cache
+from .geocoding import (
+    BASE_BACKOFF,
+    LEASE_TIME,
+    MAX_ATTEMPTS,
+    claim_tasks,
+    enqueue_geocoding,
+    enqueue_geocoding_many,
+    process_task,
+)
+from .menu import invalidate_menu, menu_cache
+from .models import (
+    ArchivedOrder,
+    ArchivedOrderProduct,
+    IdempotencyKey,
+    Order,
+    OrderGeocodeTask,
+    OrderProduct,
+    OrderStatusEvent,
+    Product,
+    ProductAvailability,
+    Restaurant,
+    RestaurantMenuItem,
+)
+
+
+def create_order(**fields):
+    return Order.objects.create(**{
+        'firstname': 'Иван',
+        'phonenumber': '+79991234567',
+        'address': 'Москва, Тверская 1',
+        'payment': 'cash',
+        **fields,
+    })
+
+
+def get_form_data(form):
+    """Return POST data that submits the form with its current values."""
+    data = {}
+    for bound_field in form:
+        widget = bound_field.field.widget
+        # Admin wraps relation widgets to add the "+" and edit links.
+        widget = getattr(widget, 'widget', widget)
+        context = widget.get_context(
+            bound_field.html_name,
+            bound_field.value(),
+            {},
+        )['widget']
+        for subwidget in context.get('subwidgets', [context]):
+            if subwidget['value'] is not None:
+                data[subwidget['name']] = subwidget['value']
+    return data
+
+
+def get_admin_change_data(response):
+    """Return POST data of an admin change page with all its inlines."""
+    data = get_form_data(response.context['adminform'].form)
+    for inline_admin_formset in response.context['inline_admin_formsets']:
+        formset = inline_admin_formset.formset
+        data.update(get_form_data(formset.management_form))
+        for form in formset.forms:
+            data.update(get_form_data(form))
+    return data
+
+
+class GeocodeQueueTest(TestCase):
+    def setUp(self):
+        self.order = create_order()
+        self.task = enqueue_geocoding(self.order)
+
+    def test_claimed_task_is_leased(self):
+        [task] = claim_tasks(batch_size=10)
+        self.assertEqual(task.attempts, 1)
+        self.assertGreater(
+            task.next_attempt_at,
+            timezone.now() + LEASE_TIME - timedelta(seconds=5),
+        )
+        self.assertEqual(claim_tasks(batch_size=10), [])
+
+    @mock.patch('foodcartapp.geocoding.get_geocode', return_value=None)
+    def test_failed_task_is_retried_with_backoff(self, get_geocode):
+        for attempt in [1, 2]:
+            OrderGeocodeTask.objects.update(next_attempt_at=timezone.now())
+            [task] = claim_tasks(batch_size=10)
+            before = timezone.now()
+            self.assertFalse(process_task(task))
+            task.refresh_from_db()
+            self.assertEqual(task.attempts, attempt)
+            self.assertEqual(task.last_error, 'Адрес не найден')
+            self.assertAlmostEqual(
+                (task.next_attempt_at - before).total_seconds(),
+                (BASE_BACKOFF * 2 ** (attempt - 1)).total_seconds(),
+                delta=5,
+            )
+        self.assertEqual(claim_tasks(batch_size=10), [])
+
+    @mock.patch(
+        'foodcartapp.geocoding.get_geocode',
+        side_effect=ValueError('Геокодер недоступен'),
+    )
+    def test_task_is_kept_failed_after_last_attempt(self, get_geocode):
+        OrderGeocodeTask.objects.update(attempts=MAX_ATTEMPTS - 1)
+        [task] = claim_tasks(batch_size=10)
+        self.assertFalse(process_task(task))
+        task.refresh_from_db()
+        self.assertIsNotNone(task.failed_at)
+        self.assertEqual(task.last_error, 'Геокодер недоступен')
+        self.order.refresh_from_db()
+        self.assertIsNone(self.order.geo)
+
+        enqueue_geocoding_many([self.order])
+        OrderGeocodeTask.objects.update(next_attempt_at=timezone.now())
+        self.assertEqual(claim_tasks(batch_size=10), [])
+        task.refresh_from_db()
+        self.assertEqual(task.attempts, MAX_ATTEMPTS)
+        self.assertIsNotNone(task.failed_at)
+
+    def test_found_coordinates_are_saved(self):
+        geo = GeoCode.objects.create(address='Тверская', lat=55.7, lon=37.6)
+        [task] = claim_tasks(batch_size=10)
+        with mock.patch(
+            'foodcartapp.geocoding.get_geocode', return_value=geo,
+        ):
+            self.assertTrue(process_task(task))
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.geo, geo)
+        self.assertFalse(OrderGeocodeTask.objects.exists())
+
+
+@mock.patch.dict('os.environ', {'YANDEX_API_KEY': 'key'})
+class GeocodeBackfillTest(TestCase):
+    coordinates = {
+        'Москва, Тверская 1': (37.61, 55.76),
+        'Москва, Арбат 2': (37.59, 55.75),
+    }
+
+    def setUp(self):
+        geocode_cache.clear()
+        shared_geocode_cache.invalidate()
+        self.restaurants = [
+            Restaurant.objects.create(name='Первый', address=address)
+            for address in ['Москва, Тверская 1', 'москва  тверская 1']
+        ]
+        self.orders = [
+            create_order(address=address)
+            for address in [
+                'Москва, Арбат 2',
+                'Москва, Арбат, 2',
+                'Москва, Тверская 1',
+                'Нигде',
+            ]
+        ]
+        for order in self.orders:
+            enqueue_geocoding(order)
+
+    def backfill(self):
+        with mock.patch(
+            'geocode.geocoder.fetch_coordinates',
+            side_effect=lambda apikey, address: self.coordinates.get(address),
+        ) as fetch_coordinates:
+            call_command(
+                'geocode_backfill', workers=2, rate=0, stdout=StringIO(),
+            )
+        return fetch_coordinates
+
+    def test_each_address_is_geocoded_once(self):
+        fetch_coordinates = self.backfill()
+        self.assertCountEqual(
+            [call.args[1] for call in fetch_coordinates.mock_calls],
+            ['Москва, Тверская 1', 'Москва, Арбат 2', 'Нигде'],
+        )
+        self.assertEqual(GeoCode.objects.count(), 3)
+        for restaurant in self.restaurants:
+            restaurant.refresh_from_db()
+            self.assertEqual(
+                (restaurant.geo.lon, restaurant.geo.lat), (37.61, 55.76),
+            )
+        geos = [
+            Order.objects.get(id=order.id).geo for order in self.orders
+        ]
+        self.assertEqual(geos[0], geos[1])
+        self.assertEqual(geos[2], self.restaurants[0].geo)
+        self.assertIsNone(geos[3])
+        self.assertEqual(
+            list(OrderGeocodeTask.objects.values_list('order', flat=True)),
+            [self.orders[3].id],
+        )
+
+        self.assertFalse(self.backfill().called)
+
+    def test_orders_are_written_in_batches(self):
+        with mock.patch(
+            'foodcartapp.management.commands.geocode_backfill.BATCH_SIZE', 2,
+        ), CaptureQueriesContext(connection) as queries:
+            self.backfill()
+        statements = [
+            query['sql'].split(' SET ')[0].split(' (')[0]
+            for query in queries.captured_queries
+        ]
+        self.assertEqual(statements.count('UPDATE "foodcartapp_order"'), 2)
+        self.assertEqual(
+            len([
+                statement for statement in statements
+                if statement.startswith('INSERT')
+                and statement.endswith('"geocode_geocode"')
+            ]),
+            1,
+        )
+
+    def test_restaurants_are_reindexed(self):
+        restaurant_index.rebuild()
+        self.backfill()
+        [(restaurant_id, distance)] = restaurant_index.nearest(
+            55.76, 37.61, k=1,
+        )
+        self.assertIn(
+            restaurant_id,
+            [restaurant.id for restaurant in self.restaurants],
+        )
+        self.assertAlmostEqual(distance, 0)
+
+
+class RefreshAvailabilityTest(TestCase):
+    def test_summaries_are_updated_in_place(self):
+        burger = Product.objects.create(name='Бургер', price=100)
+        restaurant = Restaurant.objects.create(name='Первый')
+        menu_item = RestaurantMenuItem.objects.create(
+            restaurant=restaurant, product=burger,
+        )
+        refresh_availability([burger.id])
+        refresh_availability([burger.id])
+        summary = ProductAvailability.objects.get()
+        self.assertEqual(summary.restaurant_ids, [restaurant.id])
+
+        RestaurantMenuItem.objects.filter(id=menu_item.id).update(
+            availability=False,
+        )
+        refresh_availability()
+        summary = ProductAvailability.objects.get()
+        self.assertEqual(summary.product_id, burger.id)
+        self.assertEqual(summary.restaurant_ids, [])
+        self.assertEqual(summary.restaurants_count, 0)
+
+
+class RegisterOrderTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.products = [
+            Product.objects.create(name=f'Товар {number}', price=100)
+            for number in range(20)
+        ]
+
+    def post_order(self, products, **headers):
+        return self.client.post(
+            '/api/order/',
+            {
+                'firstname': 'Иван',
+                'lastname': 'Петров',
+                'phonenumber': '+79991234567',
+                'address': 'Москва, Тверская 1',
+                'payment': 'cash',
+                'products': [
+                    {'product': product.id, 'quantity': 2}
+                    for product in products
+                ],
+            },
+            content_type='application/json',
+            **headers,
+        )
+
+    def test_query_count_does_not_depend_on_cart_size(self):
+        for cart_size in [1, 20]:
+            with self.assertNumQueries(16):
+                response = self.post_order(self.products[:cart_size])
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.json()['items_count'], cart_size * 2)
+
+    def test_replayed_key_returns_the_same_order(self):
+        first = self.post_order(self.products[:2], HTTP_IDEMPOTENCY_KEY='k1')
+        second = self.post_order(self.products[:2], HTTP_IDEMPOTENCY_KEY='k1')
+        self.assertEqual(second.status_code, 200)
+        self.assertEqual(second.json(), first.json())
+        self.assertEqual(Order.objects.count(), 1)
+
+    def test_key_reused_with_another_cart_is_rejected(self):
+        self.post_order(self.products[:2], HTTP_IDEMPOTENCY_KEY='k1')
+        response = self.post_order(
+            self.products[:3], HTTP_IDEMPOTENCY_KEY='k1',
+        )
+        self.assertEqual(response.status_code, 422)
+        self.assertEqual(Order.objects.count(), 1)
+
+    def test_expired_key_creates_new_order(self):
+        self.post_order(self.products[:2], HTTP_IDEMPOTENCY_KEY='k1')
+        IdempotencyKey.objects.update(
+            created_at=timezone.now() - timedelta(days=2),
+        )
+        response = self.post_order(
+            self.products[:2], HTTP_IDEMPOTENCY_KEY='k1',
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(Order.objects.count(), 2)
+        self.assertEqual(
+            IdempotencyKey.objects.get().order_id,
+            response.json()['id'],
+        )
+
+    def test_concurrent_duplicate_gets_stored_response(self):
+        first = self.post_order(self.products[:2], HTTP_IDEMPOTENCY_KEY='k1')
+        get_stored_response = views.get_stored_response
+        lookups = []
+
+        def miss_first_lookup(key, request_hash):
+            # The first lookup runs before the other request commits.
+            lookups.append(key)
+            if len(lookups) == 1:
+                return None
+            return get_stored_response(key, request_hash)
+
+        with mock.patch(
+            'foodcartapp.views.get_stored_response',
+            side_effect=miss_first_lookup,
+        ):
+            second = self.post_order(
+                self.products[:2], HTTP_IDEMPOTENCY_KEY='k1',
+            )
+        self.assertEqual(second.status_code, 200)
+        self.assertEqual(second.json()['id'], first.json()['id'])
+        self.assertEqual(Order.objects.count(), 1)
+
+    def test_too_long_key_is_rejected(self):
+        response = self.post_order(
+            self.products[:2], HTTP_IDEMPOTENCY_KEY='k' * 256,
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Order.objects.exists())
+
+
+class OrderTotalsTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.burger = Product.objects.create(name='Бургер', price=100)
+        cls.fries = Product.objects.create(name='Картошка', price=50)
+        cls.cola = Product.objects.create(name='Кола', price=70)
+        cls.admin = get_user_model().objects.create_superuser(
+            username='admin', password='password',
+        )
+
+    def assertTotals(self, order, total_price, items_count):
+        order.refresh_from_db()
+        self.assertEqual(order.total_price, total_price)
+        self.assertEqual(order.items_count, items_count)
+
+    def test_totals_follow_lines_changed_with_orm(self):
+        order = create_order()
+        self.assertTotals(order, 0, 0)
+        line = OrderProduct.objects.create(
+            order=order, product=self.burger, amount=2, price=100,
+        )
+        OrderProduct.objects.create(
+            order=order, product=self.fries, amount=1, price=50,
+        )
+        self.assertTotals(order, 250, 3)
+        line.amount = 3
+        line.save()
+        self.assertTotals(order, 350, 4)
+        line.delete()
+        self.assertTotals(order, 50, 1)
+
+    def test_saving_stale_order_keeps_totals(self):
+        order = create_order()
+        OrderProduct.objects.create(
+            order=order, product=self.burger, amount=2, price=100,
+        )
+        order.comment = 'Позвонить заранее'
+        order.save()
+        self.assertTotals(order, 200, 2)
+        self.assertEqual(order.comment, 'Позвонить заранее')
+
+    def test_totals_follow_lines_changed_in_admin(self):
+        order = create_order()
+        line = OrderProduct.objects.create(
+            order=order, product=self.burger, amount=2, price=100,
+        )
+        OrderProduct.objects.create(
+            order=order, product=self.fries, amount=1, price=50,
+        )
+        url = reverse('admin:foodcartapp_order_change', args=(order.id,))
+        self.client.force_login(self.admin)
+        data = get_admin_change_data(self.client.get(url))
+        data.update({
+            'products_inside-0-amount': 4,
+            'products_inside-1-DELETE': 'on',
+            'products_inside-2-product': self.cola.id,
+            'products_inside-2-amount': 3,
+        })
+        response = self.client.post(url, data)
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(
+            OrderProduct.objects.get(id=line.id).amount, 4,
+        )
+        self.assertTotals(order, 610, 7)
+
+
+class OrderStatusTest(TestCase):
+    def get_statuses(self, order):
+        return list(
+            OrderStatusEvent.objects
+            .filter(order=order)
+            .order_by('at', 'id')
+            .values_list('status', flat=True)
+        )
+
+    def test_new_order_starts_with_processing(self):
+        order = create_order()
+        self.assertEqual(self.get_statuses(order), ['1_manager'])
+        with self.assertRaises(ValidationError):
+            create_order(status='3_delivery')
+
+    def test_allowed_transitions_are_logged(self):
+        order = create_order()
+        for status in ['2_cooking', '3_delivery', '4_ready']:
+            order.status = status
+            order.save()
+        order = Order.objects.get(id=order.id)
+        order.comment = 'Без лука'
+        order.save()
+        self.assertEqual(self.get_statuses(order), [
+            '1_manager', '2_cooking', '3_delivery', '4_ready',
+        ])
+
+    def test_forbidden_transition_is_rejected(self):
+        order = create_order()
+        order.status = '4_ready'
+        with self.assertRaises(ValidationError):
+            order.save()
+        order.refresh_from_db()
+        self.assertEqual(order.status, '1_manager')
+        self.assertEqual(self.get_statuses(order), ['1_manager'])
+
+    def test_bulk_change_skips_orders_in_other_statuses(self):
+        waiting, cooking = create_order(), create_order()
+        cooking.status = '2_cooking'
+        cooking.save()
+        orders = Order.objects.filter(id__in=[waiting.id, cooking.id])
+        self.assertEqual(orders.change_status('2_cooking'), 1)
+        self.assertEqual(
+            set(orders.values_list('status', flat=True)), {'2_cooking'},
+        )
+        for order in [waiting, cooking]:
+            self.assertEqual(
+                self.get_statuses(order), ['1_manager', '2_cooking'],
+            )
+
+    def test_admin_moves_order_with_restaurant_to_cooking(self):
+        order = create_order()
+        restaurant = Restaurant.objects.create(name='Первый')
+        admin_user = get_user_model().objects.create_superuser(
+            username='admin', password='password',
+        )
+        url = reverse('admin:foodcartapp_order_change', args=(order.id,))
+        self.client.force_login(admin_user)
+        data = get_admin_change_data(self.client.get(url))
+        data['restaurant'] = restaurant.id
+        response = self.client.post(url, data)
+        self.assertEqual(response.status_code, 302)
+        order.refresh_from_db()
+        self.assertEqual(order.status, '2_cooking')
+        self.assertEqual(order.restaurant, restaurant)
+        self.assertEqual(self.get_statuses(order), ['1_manager', '2_cooking'])
+
+
+class ArchiveOrdersTest(TestCase):
+    def create_order(self, status, days_ago):
+        order = create_order()
+        OrderProduct.objects.create(
+            order=order,
+            product=Product.objects.create(name='Бургер', price=100),
+            amount=2,
+            price=100,
+        )
+        for next_status in ['2_cooking', '3_delivery', '4_ready']:
+            if order.status == status:
+                break
+            order.status = next_status
+            order.save()
+        moment = timezone.now() - timedelta(days=days_ago)
+        Order.objects.filter(id=order.id).update(
+            updated_at=moment,
+            delivered_at=moment if status == '4_ready' else None,
+        )
+        return order
+
+    def test_moves_only_old_completed_orders(self):
+        old_orders = [self.create_order('4_ready', 40) for _ in range(3)]
+        recent_order = self.create_order('4_ready', 5)
+        open_order = self.create_order('3_delivery', 40)
+
+        call_command(
+            'archive_orders', '--days=30', '--batch-size=2', stdout=StringIO(),
+        )
+
+        self.assertEqual(
+            set(Order.objects.values_list('id', flat=True)),
+            {recent_order.id, open_order.id},
+        )
+        self.assertEqual(
+            set(OrderProduct.objects.values_list('order', flat=True)),
+            {recent_order.id, open_order.id},
+        )
+        self.assertFalse(
+            OrderStatusEvent.objects.filter(
+                order__in=[order.id for order in old_orders],
+            ).exists()
+        )
+        archived_order = ArchivedOrder.objects.get(id=old_orders[0].id)
+        self.assertEqual(archived_order.total_price, 200)
+        self.assertEqual(archived_order.items_count, 2)
+        self.assertEqual(
+            [event['status'] for event in archived_order.status_history],
+            ['1_manager', '2_cooking', '3_delivery', '4_ready'],
+        )
+        archived_line = ArchivedOrderProduct.objects.get(order=archived_order)
+        self.assertEqual(
+            (archived_line.product_name, archived_line.amount),
+            ('Бургер', 2),
+        )
+        self.assertEqual(ArchivedOrder.objects.count(), 3)
+
+
+class OrderAdminSearchTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = get_user_model().objects.create_superuser(
+            username='admin', password='password',
+        )
+        cls.petrov = create_order(
+            lastname='Петров',
+            address='Москва, Тверская',
+        )
+        cls.sidorov = create_order(
+            lastname='Сидоров',
+            phonenumber='+79997654321',
+            address='Москва, Арбат',
+        )
+
+    def search(self, query):
+        self.client.force_login(self.admin)
+        response = self.client.get(
+            reverse('admin:foodcartapp_order_changelist'), {'q': query},
+        )
+        return {order.id for order in response.context['cl'].result_list}
+
+    def test_search_by_indexed_fields(self):
+        self.assertEqual(self.search('+79997654321'), {self.sidorov.id})
+        self.assertEqual(self.search(str(self.petrov.id)), {self.petrov.id})
+        self.assertEqual(self.search('Петр'), {self.petrov.id})
+        self.assertEqual(self.search('етров'), set())
+        self.assertEqual(self.search('Арбат'), {self.sidorov.id})
+
+
+class CachedApiTest(TestCase):
+    def assertServedFromOneRead(self, url, cache):
+        with mock.patch.object(cache, 'get', wraps=cache.get) as cache_get:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(cache_get.call_count, 1)
+        etag = response['ETag']
+        self.assertEqual(
+            etag, f'"{hashlib.md5(response.content).hexdigest()}"',
+        )
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+    def test_products_are_read_once_per_request(self):
+        self.assertServedFromOneRead('/api/products/', menu_cache)
+
+    def test_banners_are_read_once_per_request(self):
+        self.assertServedFromOneRead('/api/banners/', banners_cache)
+
+    def test_lost_version_does_not_revive_stale_keys(self):
+        menu_cache.set('payload', 'старое меню')
+        menu_cache.invalidate()
+        menu_cache.set('payload', 'новое меню')
+        menu_cache.cache.delete(menu_cache.version_key)
+        self.assertIsNone(menu_cache.get('payload'))
+
+
+class ThumbnailsTest(TestCase):
+    def setUp(self):
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        settings_override = override_settings(MEDIA_ROOT=media_root.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def create_product(self):
+        content = BytesIO()
+        Image.new('RGB', (600, 400), 'red').save(content, 'PNG')
+        product = Product(name='Бургер', price=100)
+        product.image.save(
+            'burger.png', ContentFile(content.getvalue()), save=False,
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            product.save()
+        restaurant = Restaurant.objects.create(name='Первый')
+        RestaurantMenuItem.objects.create(
+            restaurant=restaurant, product=product,
+        )
+        refresh_availability([product.id])
+        invalidate_menu()
+        return product
+
+    def test_thumbnails_are_made_on_upload_and_served(self):
+        product = self.create_product()
+        storage = product.image.storage
+        stem = product.image.name.rsplit('.', 1)[0]
+        for width in [100, 200, 400]:
+            for extension in ['webp', 'jpeg']:
+                self.assertTrue(storage.exists(
+                    f'thumbnails/{stem}-{width}w.{extension}'
+                ))
+        self.assertFalse(storage.exists(f'thumbnails/{stem}-800w.jpeg'))
+
+        [serialized] = self.client.get('/api/products/').json()
+        self.assertEqual(
+            serialized['thumbnail'],
+            storage.url(f'thumbnails/{stem}-400w.jpeg'),
+        )
+        self.assertIn(
+            storage.url(f'thumbnails/{stem}-200w.webp') + ' 200w',
+            serialized['srcset']['webp'],
+        )
+
+        manager = get_user_model().objects.create_user(
+            username='manager', password='password', is_staff=True,
+        )
+        self.client.force_login(manager)
+        response = self.client.get(reverse('restaurateur:ProductsView'))
+        self.assertContains(
+            response, storage.url(f'thumbnails/{stem}-100w.jpeg'),
+        )
+        self.assertNotContains(response, f'src="{product.image.url}"')
@@ -0,0 +1,126 @@
+import logging
+import os
+from io import BytesIO
+
+from django.core.files.base import ContentFile
+from PIL import Image, ImageOps
+
+from star_burger.caching import CacheNamespace
+
+
+THUMBNAIL_WIDTHS = [100, 200, 400, 800]
+THUMBNAIL_FORMATS = {
+    'webp': ('WEBP', {'quality': 80, 'method': 4}),
+    'jpeg': ('JPEG', {'quality': 82, 'optimize': True, 'progressive': True}),
+}
+THUMBNAILS_DIR = 'thumbnails'
+
+thumbnails_cache = CacheNamespace('thumbnails', timeout=24 * 60 * 60)
+
+
+def get_thumbnail_name(name, width, image_format):
+    stem = os.path.splitext(name)[0]
+    return os.path.join(THUMBNAILS_DIR, f'{stem}-{width}w.{image_format}')
+
+
+def to_rgb(image):
+    """Flatten transparency on white, JPEG has no alpha channel."""
+    if image.mode in ('RGBA', 'LA', 'P'):
+        image = image.convert('RGBA')
+        background = Image.new('RGB', image.size, 'white')
+        background.paste(image, mask=image.getchannel('A'))
+        return background
+    return image.convert('RGB')
+
+
+def make_thumbnails(image):
+    """Store WebP and JPEG copies of the image for every thumbnail width.
+
+    Widths larger than the original are skipped, existing thumbnails are
+    kept. Returns names of thumbnails by format and width.
+    """
+    storage = image.storage
+    missing = [
+        (width, image_format)
+        for width in THUMBNAIL_WIDTHS
+        for image_format in THUMBNAIL_FORMATS
+        if not storage.exists(
+            get_thumbnail_name(image.name, width, image_format)
+        )
+    ]
+    if missing:
+        try:
+            with image.open('rb') as image_file:
+                original = ImageOps.exif_transpose(Image.open(image_file))
+                original.load()
+        except (OSError, ValueError) as error:
+            logging.warning(
+                f'Can not make thumbnails of {image.name}: {error}'
+            )
+            return {}
+        original = to_rgb(original)
+        for width, image_format in missing:
+            if width > original.width:
+                continue
+            thumbnail = original.copy()
+            thumbnail.thumbnail((width, original.height))
+            pillow_format, options = THUMBNAIL_FORMATS[image_format]
+            content = BytesIO()
+            thumbnail.save(content, pillow_format, **options)
+            storage.save(
+                get_thumbnail_name(image.name, width, image_format),
+                ContentFile(content.getvalue()),
+            )
+
+    thumbnails = {}
+    for width in THUMBNAIL_WIDTHS:
+        for image_format in THUMBNAIL_FORMATS:
+            name = get_thumbnail_name(image.name, width, image_format)
+            if storage.exists(name):
+                thumbnails.setdefault(image_format, {})[width] = name
+    return thumbnails
+
+
+def get_thumbnails(image):
+    """Return names of thumbnails, making missing ones on first use."""
+    return thumbnails_cache.get_or_set(
+        image.name,
+        lambda: make_thumbnails(image),
+    )
+
+
+def refresh_thumbnails(image):
+    """Make thumbnails right after the image was uploaded."""
+    if image:
+        thumbnails_cache.set(image.name, make_thumbnails(image))
+
+
+def get_srcsets(image):
+    """Return srcset strings by format, e.g. {'webp': 'a-100w.webp 100w'}."""
+    if not image:
+        return {}
+    return {
+        image_format: ', '.join(
+            f'{image.storage.url(name)} {width}w'
+            for width, name in names.items()
+        )
+        for image_format, names in get_thumbnails(image).items()
+    }
+
+
+def get_thumbnail_url(image, width, image_format='jpeg'):
+    """Return URL of the smallest thumbnail at least `width` wide.
+
+    Falls back to the largest thumbnail and then to the original image.
+    """
+    if not image:
+        return ''
+    names = get_thumbnails(image).get(image_format)
+    if not names:
+        return image.url
+    fitting_widths = [
+        thumbnail_width for thumbnail_width in names
+        if thumbnail_width >= width
+    ]
+    chosen_width = min(fitting_widths) if fitting_widths else max(names)
+    return image.storage.url(names[chosen_width])
@@ -1,78 +1,149 @@
+import hashlib
+import json
 import logging
+from datetime import timedelta
 
-from django.http import JsonResponse
-from django.templatetags.static import static
+from django.db import IntegrityError, transaction
+from django.http import HttpResponse, JsonResponse
+from django.utils import timezone
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import condition
 from environs import Env
 from rest_framework.decorators import api_view
 
-from .models import Product
+from .banners import get_banners
+from .menu import get_menu
+from .models import IdempotencyKey
 from .serializers import OrderSerializer
 
 
 env = Env()
 env.read_env()
 
+IDEMPOTENCY_KEY_TTL = timedelta(
+    hours=env.int('IDEMPOTENCY_KEY_TTL_HOURS', 24)
+)
+
 logging.basicConfig(
     format="%(process)d %(levelname)s %(message)s",
     level=logging.INFO
 )
 
 
+def memoize_on_request(get_payload):
+    """Return function reading the cached payload once per request.
+
+    The ETag, Last-Modified and body of a response then come from one
+    cache round trip and always describe the same version.
+    """
+    attribute = f'_{get_payload.__name__}_payload'
+
+    def get_request_payload(request):
+        if not hasattr(request, attribute):
+            setattr(request, attribute, get_payload())
+        return getattr(request, attribute)
+
+    return get_request_payload
+
+
+get_request_menu = memoize_on_request(get_menu)
+get_request_banners = memoize_on_request(get_banners)
+
+
+@cache_control(no_cache=True)
+@condition(
+    etag_func=lambda request: get_request_banners(request)['etag'],
+    last_modified_func=(
+        lambda request: get_request_banners(request)['last_modified']
+    ),
+)
 def banners_list_api(request):
-    # FIXME move data to db?
-    return JsonResponse([
-        {
-            'title': 'Burger',
-            'src': static('burger.jpg'),
-            'text': 'Tasty Burger at your door step',
-        },
-        {
-            'title': 'Spices',
-            'src': static('food.jpg'),
-            'text': 'All Cuisines',
-        },
-        {
-            'title': 'New York',
-            'src': static('tasty.jpg'),
-            'text': 'Food is incomplete without a tasty dessert',
-        }
-    ], safe=False, json_dumps_params={
-        'ensure_ascii': False,
-        'indent': 4,
-    })
+    return HttpResponse(
+        get_request_banners(request)['content'],
+        content_type='application/json',
+    )
 
 
+@cache_control(no_cache=True)
+@condition(
+    etag_func=lambda request: get_request_menu(request)['etag'],
+    last_modified_func=(
+        lambda request: get_request_menu(request)['last_modified']
+    ),
+)
 def product_list_api(request):
-    products = Product.objects.select_related('category').available()
-
-    dumped_products = []
-    for product in products:
-        dumped_product = {
-            'id': product.id,
-            'name': product.name,
-            'price': product.price,
-            'special_status': product.special_status,
-            'description': product.description,
-            'category': {
-                'id': product.category.id,
-                'name': product.category.name,
-            } if product.category else None,
-            'image': product.image.url,
-            'restaurant': {
-                'id': product.id,
-                'name': product.name,
-            }
-        }
-        dumped_products.append(dumped_product)
-    return JsonResponse(dumped_products, safe=False, json_dumps_params={
-        'ensure_ascii': False,
-        'indent': 4,
-    })
+    return HttpResponse(
+        get_request_menu(request)['content'],
+        content_type='application/json',
+    )
+
+
+def get_request_hash(data):
+    """Return hash of the request payload that ignores key order."""
+    payload = json.dumps(data, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode()).hexdigest()
 
 
 @api_view(['POST'])
 def register_order(request):
+    key = request.headers.get('Idempotency-Key')
+    if key:
+        max_length = IdempotencyKey._meta.get_field('key').max_length
+        if len(key) > max_length:
+            return JsonResponse(
+                {'error': f'Idempotency-Key длиннее {max_length} символов'},
+                status=400,
+            )
+        request_hash = get_request_hash(request.data)
+        stored_response = get_stored_response(key, request_hash)
+        if stored_response:
+            return stored_response
+
     serializer = OrderSerializer(data=request.data)
     serializer.is_valid(raise_exception=True)
-    serializer.save()
+    try:
+        with transaction.atomic():
+            order = serializer.save()
+            if key:
+                IdempotencyKey.objects.create(
+                    key=key,
+                    request_hash=request_hash,
+                    order=order,
+                    response=serializer.data,
+                    status_code=200,
+                )
+    except IntegrityError:
+        stored_response = (
+            get_stored_response(key, request_hash) if key else None
+        )
+        if stored_response:
+            return stored_response
+        raise
     return JsonResponse(serializer.data)
+
+
+def get_stored_response(key, request_hash):
+    """Return response of an earlier request with the same key.
+
+    A key reused with another payload gets 422 instead of the response
+    stored for somebody else's order. Keys saved before payload hashes
+    were stored have an empty hash and are not checked.
+    """
+    idempotency_key = IdempotencyKey.objects.filter(key=key).first()
+    if not idempotency_key:
+        return None
+    if idempotency_key.created_at < timezone.now() - IDEMPOTENCY_KEY_TTL:
+        idempotency_key.delete()
+        return None
+    if (
+        idempotency_key.request_hash
+        and idempotency_key.request_hash != request_hash
+    ):
+        return JsonResponse(
+            {'error': 'Idempotency-Key уже использован с другим заказом'},
+            status=422,
+        )
+    return JsonResponse(
+        idempotency_key.response,
+        status=idempotency_key.status_code,
+    )
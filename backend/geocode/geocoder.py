@@ -0,0 +1,273 @@
+import logging
+import re
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from threading import Lock
+
+import requests
+from django.utils import timezone
+from environs import Env
+
+from restaurateur.spatial import bump_index_version
+from star_burger.caching import CacheNamespace
+
+from .models import GeoCode
+
+
+env = Env()
+env.read_env()
+
+GEOCODE_TTL = timedelta(days=env.int('GEOCODE_TTL_DAYS', 30))
+GEOCODE_NEGATIVE_TTL = timedelta(
+    hours=env.int('GEOCODE_NEGATIVE_TTL_HOURS', 24)
+)
+GEOCODE_LRU_SIZE = env.int('GEOCODE_LRU_SIZE', 1024)
+GEOCODER_TIMEOUT = env.float('GEOCODER_TIMEOUT', 5)
+
+
+class LRUCache:
+    """Small thread-safe in-process LRU cache."""
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self._items = OrderedDict()
+        self._lock = Lock()
+
+    def get(self, key):
+        with self._lock:
+            if key not in self._items:
+                return None
+            self._items.move_to_end(key)
+            return self._items[key]
+
+    def set(self, key, value):
+        with self._lock:
+            self._items[key] = value
+            self._items.move_to_end(key)
+            while len(self._items) > self.maxsize:
+                self._items.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._items.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+
+
+geocode_cache = LRUCache(GEOCODE_LRU_SIZE)
+shared_geocode_cache = CacheNamespace(
+    'geocode',
+    timeout=int(GEOCODE_NEGATIVE_TTL.total_seconds()),
+)
+
+
+def normalize_address(address):
+    """Return address in the form used as a cache key."""
+    return ' '.join(re.sub(r'[^\w]+', ' ', address.lower()).split())
+
+
+def fetch_coordinates(apikey, address):
+    base_url = "https://geocode-maps.yandex.ru/1.x"
+    response = requests.get(base_url, params={
+        "geocode": address,
+        "apikey": apikey,
+        "format": "json",
+    }, timeout=GEOCODER_TIMEOUT)
+    response.raise_for_status()
+    found_places = response.json()['response']['GeoObjectCollection'][
+        'featureMember']
+
+    if not found_places:
+        return None
+
+    most_relevant = found_places[0]
+    lon, lat = most_relevant['GeoObject']['Point']['pos'].split(" ")
+    return float(lon), float(lat)
+
+
+class RateLimiter:
+    """Allow at most `rate` calls per second across threads."""
+
+    def __init__(self, rate):
+        self.interval = 1 / rate if rate else 0
+        self._next_call = time.monotonic()
+        self._lock = Lock()
+
+    def wait(self):
+        with self._lock:
+            now = time.monotonic()
+            delay = self._next_call - now
+            self._next_call = max(now, self._next_call) + self.interval
+        if delay > 0:
+            time.sleep(delay)
+
+
+def is_expired(geo):
+    ttl = GEOCODE_TTL if geo.is_resolved else GEOCODE_NEGATIVE_TTL
+    return geo.created + ttl < timezone.now()
+
+
+def refresh_geocode(geo, address, key):
+    """Geocode address and store the result, negative one included."""
+    try:
+        coordinates = fetch_coordinates(env.str('YANDEX_API_KEY'), address)
+    except (requests.RequestException, KeyError, ValueError) as error:
+        logging.warning(f'Geocoding of {address} failed: {error}')
+        return geo
+    lon, lat = coordinates or (None, None)
+    geo, created = GeoCode.objects.update_or_create(
+        normalized_address=key,
+        defaults={
+            'address': address,
+            'lon': lon,
+            'lat': lat,
+            'created': timezone.now(),
+        },
+    )
+    if created:
+        logging.info(f'Geo for {address} created.')
+    return geo
+
+
+def get_geocode(address):
+    """Return resolved GeoCode for address or None.
+
+    Lookups go through the in-process LRU, the shared cache, then the
+    GeoCode table, and only reach the geocoder when the address is unknown
+    or its entry is stale. Addresses the geocoder can not resolve are
+    cached too.
+    """
+    key = normalize_address(address or '')
+    if not key:
+        return None
+
+    geo = geocode_cache.get(key)
+    if geo is None or is_expired(geo):
+        geo = shared_geocode_cache.get(key)
+    if geo is None or is_expired(geo):
+        geo = GeoCode.objects.filter(normalized_address=key).first()
+    if geo is None or is_expired(geo):
+        geo = refresh_geocode(geo, address, key)
+    if geo is None:
+        return None
+
+    geocode_cache.set(key, geo)
+    shared_geocode_cache.set(key, geo)
+    return geo if geo.is_resolved else None
+
+
+def group_addresses(addresses):
+    """Return mapping of normalized address to the first raw address."""
+    addresses_by_key = {}
+    for address in addresses:
+        key = normalize_address(address or '')
+        if key:
+            addresses_by_key.setdefault(key, address)
+    return addresses_by_key
+
+
+def load_geocodes(keys):
+    """Read GeoCodes of normalized addresses from the cache and database.
+
+    Fresh entries come from the shared cache and the rest of them from one
+    query. Unresolved and expired entries are returned too.
+    """
+    geos = {
+        key: geo
+        for key, geo in shared_geocode_cache.get_many(list(keys)).items()
+        if not is_expired(geo)
+    }
+    geos.update(GeoCode.objects.in_bulk(
+        [key for key in keys if key not in geos],
+        field_name='normalized_address',
+    ))
+    return geos
+
+
+def find_geocodes(addresses):
+    """Return mapping of normalized address to known resolved GeoCode.
+
+    Unlike get_geocodes() the geocoder is never called, so this is safe to
+    use while rendering pages. Stale coordinates are returned as well.
+    """
+    return {
+        key: geo
+        for key, geo in load_geocodes(group_addresses(addresses)).items()
+        if geo.is_resolved
+    }
+
+
+def get_geocodes(addresses, max_workers=8, rate=10):
+    """Return mapping of normalized address to resolved GeoCode.
+
+    Known addresses are read with load_geocodes(). Unknown ones are
+    resolved concurrently, at most `rate` geocoder requests per second,
+    and saved in bulk. Bulk updates do not send post_save, so restaurant
+    indexes are marked stale when refreshed GeoCodes belong to restaurants.
+    """
+    addresses_by_key = group_addresses(addresses)
+    cached_geos = load_geocodes(addresses_by_key)
+    keys_to_fetch = [
+        key for key in addresses_by_key
+        if key not in cached_geos or is_expired(cached_geos[key])
+    ]
+
+    rate_limiter = RateLimiter(rate)
+
+    def fetch(key):
+        rate_limiter.wait()
+        try:
+            return fetch_coordinates(
+                env.str('YANDEX_API_KEY'),
+                addresses_by_key[key],
+            )
+        except (requests.RequestException, KeyError, ValueError) as error:
+            logging.warning(
+                f'Geocoding of {addresses_by_key[key]} failed: {error}'
+            )
+            return False
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        fetched_coordinates = dict(
+            zip(keys_to_fetch, executor.map(fetch, keys_to_fetch))
+        )
+
+    now = timezone.now()
+    new_geos = []
+    stale_geos = []
+    for key, coordinates in fetched_coordinates.items():
+        if coordinates is False:
+            continue
+        lon, lat = coordinates or (None, None)
+        geo = cached_geos.get(key) or GeoCode(
+            address=addresses_by_key[key],
+            normalized_address=key,
+        )
+        geo.lon, geo.lat, geo.created = lon, lat, now
+        if geo.pk:
+            stale_geos.append(geo)
+        else:
+            new_geos.append(geo)
+    GeoCode.objects.bulk_create(new_geos, ignore_conflicts=True)
+    GeoCode.objects.bulk_update(stale_geos, ['lon', 'lat', 'created'])
+    if GeoCode.objects.filter(
+        id__in=[geo.id for geo in stale_geos],
+        restaurants__isnull=False,
+    ).exists():
+        bump_index_version()
+
+    if new_geos:
+        cached_geos.update(GeoCode.objects.in_bulk(
+            [geo.normalized_address for geo in new_geos],
+            field_name='normalized_address',
+        ))
+    for key, geo in cached_geos.items():
+        geocode_cache.set(key, geo)
+    shared_geocode_cache.set_many(cached_geos)
+    return {
+        key: geo for key, geo in cached_geos.items() if geo.is_resolved
+    }
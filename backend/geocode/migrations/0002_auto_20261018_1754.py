@@ -0,0 +1,52 @@
+# Generated by Django 3.2.15 on 2026-10-18 14:54
+
+import re
+
+from django.db import migrations, models
+
+
+def set_normalized_address(apps, schema_editor):
+    GeoCode = apps.get_model('geocode', 'GeoCode')
+    seen_addresses = set()
+    for geo in GeoCode.objects.order_by('-created').iterator():
+        normalized_address = ' '.join(
+            re.sub(r'[^\w]+', ' ', geo.address.lower()).split()
+        )
+        if not normalized_address or normalized_address in seen_addresses:
+            continue
+        seen_addresses.add(normalized_address)
+        geo.normalized_address = normalized_address
+        geo.save(update_fields=['normalized_address'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('geocode', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='geocode',
+            name='normalized_address',
+            field=models.CharField(blank=True, max_length=200, null=True, unique=True, verbose_name='Нормализованный адрес'),
+        ),
+        migrations.AlterField(
+            model_name='geocode',
+            name='lat',
+            field=models.FloatField(blank=True, null=True, verbose_name='Широта'),
+        ),
+        migrations.AlterField(
+            model_name='geocode',
+            name='lon',
+            field=models.FloatField(blank=True, null=True, verbose_name='Долгота'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='geocode',
+            unique_together=set(),
+        ),
+        migrations.RunPython(
+            set_normalized_address,
+            migrations.RunPython.noop,
+        ),
+    ]
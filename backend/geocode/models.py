@@ -7,12 +7,20 @@ class GeoCode(models.Model):
         'Адрес',
         max_length=200,
     )
-    lon = models.FloatField('Долгота')
-    lat = models.FloatField('Широта')
+    normalized_address = models.CharField(
+        'Нормализованный адрес',
+        max_length=200,
+        unique=True,
+        blank=True,
+        null=True,
+    )
+    lon = models.FloatField('Долгота', blank=True, null=True)
+    lat = models.FloatField('Широта', blank=True, null=True)
     created = models.DateTimeField('Время запроса', default=timezone.now)
 
-    class Meta:
-        unique_together = [['lon', 'lat'], ]
-
     def __str__(self) -> str:
         return f'Geo for {self.address}'
+
+    @property
+    def is_resolved(self):
+        return self.lon is not None and self.lat is not None
@@ -0,0 +1,151 @@
+import warnings
+from datetime import timedelta
+from unittest import mock
+
+from django.core.cache import CacheKeyWarning
+
+from django.test import SimpleTestCase, TestCase
+from django.utils import timezone
+
+from foodcartapp.models import Restaurant
+from restaurateur.spatial import RestaurantIndex, restaurant_index
+
+from .geocoder import (
+    GEOCODE_NEGATIVE_TTL,
+    GEOCODE_TTL,
+    RateLimiter,
+    geocode_cache,
+    get_geocode,
+    get_geocodes,
+    shared_geocode_cache,
+)
+from .models import GeoCode
+
+
+def make_geocoder_response(pos):
+    """Return geocoder response with the point, or with nothing if None."""
+    response = mock.Mock()
+    response.json.return_value = {'response': {'GeoObjectCollection': {
+        'featureMember': [
+            {'GeoObject': {'Point': {'pos': pos}}},
+        ] if pos else [],
+    }}}
+    return response
+
+
+@mock.patch.dict('os.environ', {'YANDEX_API_KEY': 'key'})
+class GeocoderTest(TestCase):
+    def setUp(self):
+        geocode_cache.clear()
+        shared_geocode_cache.invalidate()
+
+    @mock.patch('geocode.geocoder.requests.get')
+    def test_geocoded_restaurant_gets_into_index(self, get):
+        get.return_value = make_geocoder_response('37.6 55.7')
+        geo = get_geocode('Москва, Тверская 1')
+        self.assertEqual((geo.lon, geo.lat), (37.6, 55.7))
+
+        restaurant = Restaurant.objects.create(name='Первый', geo=geo)
+        restaurant_index.ensure_fresh()
+        self.assertEqual(
+            restaurant_index.nearest(55.7, 37.6, k=1)[0][0],
+            restaurant.id,
+        )
+        self.assertEqual(
+            RestaurantIndex().nearest(55.7, 37.6, k=1)[0][0],
+            restaurant.id,
+        )
+
+    @mock.patch('geocode.geocoder.requests.get')
+    def test_bulk_geocoding_stores_floats(self, get):
+        get.return_value = make_geocoder_response('37.5 55.6')
+        geos = get_geocodes(['Москва, Арбат 2'])
+        geo = list(geos.values())[0]
+        self.assertEqual((geo.lon, geo.lat), (37.5, 55.6))
+        self.assertIsInstance(geo.lat, float)
+
+    @mock.patch('geocode.geocoder.requests.get')
+    def test_cache_keys_are_safe_for_memcached(self, get):
+        get.return_value = make_geocoder_response('37.5 55.6')
+        with warnings.catch_warnings():
+            warnings.simplefilter('error', CacheKeyWarning)
+            get_geocode('Москва, улица Арбат, дом 2')
+            geocode_cache.clear()
+            geo = get_geocode('москва улица арбат дом 2')
+        self.assertEqual(get.call_count, 1)
+        self.assertEqual(geo.lat, 55.6)
+
+    @mock.patch('geocode.geocoder.requests.get')
+    def test_bulk_refresh_reindexes_restaurants(self, get):
+        geo = GeoCode.objects.create(
+            address='Москва, Тверская 1',
+            normalized_address='москва тверская 1',
+            lon=37.6,
+            lat=55.7,
+            created=timezone.now() - GEOCODE_TTL - timedelta(days=1),
+        )
+        restaurant = Restaurant.objects.create(name='Первый', geo=geo)
+        restaurant_index.rebuild()
+        get.return_value = make_geocoder_response('30.3 59.9')
+        get_geocodes(['Москва, Тверская 1'])
+        [(restaurant_id, distance)] = restaurant_index.nearest(
+            59.9, 30.3, k=1,
+        )
+        self.assertEqual(restaurant_id, restaurant.id)
+        self.assertAlmostEqual(distance, 0)
+
+
+    @mock.patch('geocode.geocoder.requests.get')
+    def test_unresolved_address_is_requested_once(self, get):
+        get.return_value = make_geocoder_response(None)
+        self.assertIsNone(get_geocode('Нигде'))
+        self.assertIsNone(get_geocode('Нигде'))
+        geocode_cache.clear()
+        self.assertIsNone(get_geocode('нигде'))
+        shared_geocode_cache.invalidate()
+        self.assertEqual(get_geocodes(['Нигде!']), {})
+        self.assertIsNone(get_geocode('Нигде'))
+        self.assertEqual(get.call_count, 1)
+        self.assertIsNone(GeoCode.objects.get().lat)
+
+    def assertRefreshedAfter(self, get, ttl, pos):
+        get.return_value = make_geocoder_response(pos)
+        get_geocode('Москва, Тверская 1')
+        get.return_value = make_geocoder_response('37.5 55.6')
+        now = timezone.now()
+        for shift, call_count in [(-1, 1), (1, 2)]:
+            with mock.patch(
+                'geocode.geocoder.timezone.now',
+                return_value=now + ttl + timedelta(minutes=shift),
+            ):
+                geo = get_geocode('Москва, Тверская 1')
+            self.assertEqual(get.call_count, call_count)
+        self.assertEqual((geo.lon, geo.lat), (37.5, 55.6))
+        self.assertEqual(GeoCode.objects.get().lat, 55.6)
+
+    @mock.patch('geocode.geocoder.requests.get')
+    def test_expired_coordinates_are_refreshed(self, get):
+        self.assertRefreshedAfter(get, GEOCODE_TTL, '37.6 55.7')
+
+    @mock.patch('geocode.geocoder.requests.get')
+    def test_expired_negative_result_is_refreshed(self, get):
+        self.assertRefreshedAfter(get, GEOCODE_NEGATIVE_TTL, None)
+
+
+class RateLimiterTest(SimpleTestCase):
+    @mock.patch('geocode.geocoder.time.sleep')
+    @mock.patch('geocode.geocoder.time.monotonic', return_value=100.0)
+    def test_calls_are_spaced_by_interval(self, monotonic, sleep):
+        rate_limiter = RateLimiter(rate=4)
+        for _ in range(3):
+            rate_limiter.wait()
+        self.assertEqual(
+            [call.args[0] for call in sleep.mock_calls], [0.25, 0.5],
+        )
+
+    @mock.patch('geocode.geocoder.time.sleep')
+    def test_zero_rate_is_unlimited(self, sleep):
+        rate_limiter = RateLimiter(rate=0)
+        for _ in range(3):
+            rate_limiter.wait()
+        sleep.assert_not_called()
@@ -0,0 +1,89 @@
+from collections import defaultdict
+
+from foodcartapp.models import Order, Restaurant
+
+from .capacity import (
+    get_kitchen_load,
+    invalidate_kitchen_load,
+    rank_restaurants,
+)
+from .matching import find_restaurant_ids, load_availability
+
+
+def choose_restaurant(order, restaurants, availability, load):
+    """Return id of the restaurant that will deliver the order soonest."""
+    restaurant_ids = find_restaurant_ids(
+        [
+            order_product.product_id
+            for order_product
+            in order.products_inside.all()
+        ],
+        availability,
+    )
+    ranked = rank_restaurants(
+        order.geo.lat,
+        order.geo.lon,
+        restaurants,
+        restaurant_ids=restaurant_ids,
+        load=load,
+    )
+    if not ranked:
+        return None
+    restaurant_id, _, _ = ranked[0]
+    return restaurant_id
+
+
+def assign_restaurants(batch_size=100):
+    """Assign restaurants to all new orders, walking them in batches.
+
+    Returns number of assigned orders. Orders a manager has already
+    handled in the meantime are left untouched.
+    """
+    new_orders = (
+        Order.objects
+        .filter(
+            status='1_manager',
+            restaurant__isnull=True,
+            geo__lat__isnull=False,
+        )
+        .select_related('geo')
+        .prefetch_related('products_inside')
+        .order_by('id')
+    )
+    availability = load_availability()
+    restaurants = Restaurant.objects.only(
+        'id',
+        'capacity',
+        'cooking_minutes',
+    ).in_bulk()
+    load = dict(get_kitchen_load())
+    assigned_count = 0
+    last_id = 0
+    while True:
+        orders = list(new_orders.filter(id__gt=last_id)[:batch_size])
+        if not orders:
+            return assigned_count
+        last_id = orders[-1].id
+
+        order_ids_by_restaurant = defaultdict(list)
+        for order in orders:
+            restaurant_id = choose_restaurant(
+                order,
+                restaurants,
+                availability,
+                load,
+            )
+            if restaurant_id is None:
+                continue
+            order_ids_by_restaurant[restaurant_id].append(order.id)
+            load[restaurant_id] = load.get(restaurant_id, 0) + 1
+
+        for restaurant_id, order_ids in order_ids_by_restaurant.items():
+            assigned_count += Order.objects.filter(
+                id__in=order_ids,
+                status='1_manager',
+                restaurant__isnull=True,
+            ).change_status('2_cooking', restaurant_id=restaurant_id)
+        invalidate_kitchen_load()
+        if len(orders) < batch_size:
+            return assigned_count
@@ -0,0 +1,110 @@
+from django.db.models import Count
+from environs import Env
+
+from foodcartapp.models import Order
+from star_burger.caching import CacheNamespace
+
+from .spatial import restaurant_index
+
+
+env = Env()
+env.read_env()
+
+COURIER_SPEED_KMH = env.float('COURIER_SPEED_KMH', 20)
+RANKED_RESTAURANTS = env.int('RANKED_RESTAURANTS', 5)
+CANDIDATES_PER_RANKED = 3
+
+kitchen_load_cache = CacheNamespace('kitchen-load', timeout=60)
+
+
+def get_kitchen_load():
+    """Return number of orders being cooked by each restaurant.
+
+    The counts are cached until an order changes.
+    """
+    return kitchen_load_cache.get_or_set('orders', lambda: dict(
+        Order.objects
+        .filter(status='2_cooking', restaurant__isnull=False)
+        .values('restaurant')
+        .annotate(orders_count=Count('id'))
+        .values_list('restaurant', 'orders_count')
+    ))
+
+
+def invalidate_kitchen_load():
+    kitchen_load_cache.invalidate()
+
+
+def get_wait_minutes(restaurant, orders_count):
+    """Return how long a new order waits for a free place in the kitchen."""
+    queued_orders = orders_count + 1 - restaurant.capacity
+    if queued_orders <= 0:
+        return 0
+    return queued_orders * restaurant.cooking_minutes / restaurant.capacity
+
+
+def get_cost_minutes(restaurant, distance, orders_count):
+    """Return expected minutes of kitchen queue plus delivery."""
+    delivery_minutes = distance / COURIER_SPEED_KMH * 60
+    return delivery_minutes + get_wait_minutes(restaurant, orders_count)
+
+
+def rank_restaurants(lat, lon, restaurants, restaurant_ids=None, load=None,
+                     limit=RANKED_RESTAURANTS):
+    """Return up to `limit` (restaurant id, km, wait minutes), cheapest first.
+
+    `restaurants` maps ids to Restaurant objects with capacity settings,
+    `load` is the result of get_kitchen_load(). Only CANDIDATES_PER_RANKED
+    times more nearest restaurants than `limit` are taken from the spatial
+    index, so that a busy kitchen nearby can lose to a free one further
+    away without measuring distance to every restaurant.
+    """
+    if load is None:
+        load = get_kitchen_load()
+    nearest = restaurant_index.nearest(
+        lat,
+        lon,
+        k=limit * CANDIDATES_PER_RANKED if limit else None,
+        restaurant_ids=restaurant_ids,
+    )
+    return score_restaurants(nearest, restaurants, load, limit)
+
+
+def rank_restaurants_many(points, restaurants, restaurant_ids=None,
+                          load=None, limit=RANKED_RESTAURANTS):
+    """Rank restaurants for every (lat, lon) point, see rank_restaurants().
+
+    Distances for all points are measured with one distance matrix, which
+    is cheaper than asking the spatial index for every point separately.
+    """
+    if load is None:
+        load = get_kitchen_load()
+    return [
+        score_restaurants(nearest, restaurants, load, limit)
+        for nearest in restaurant_index.nearest_many(
+            points,
+            k=limit * CANDIDATES_PER_RANKED if limit else None,
+            restaurant_ids=restaurant_ids,
+        )
+    ]
+
+
+def score_restaurants(nearest, restaurants, load, limit):
+    """Order (restaurant id, km) pairs by kitchen queue plus delivery."""
+    ranked = []
+    for restaurant_id, distance in nearest:
+        restaurant = restaurants.get(restaurant_id)
+        if restaurant is None:
+            continue
+        orders_count = load.get(restaurant_id, 0)
+        ranked.append((
+            get_cost_minutes(restaurant, distance, orders_count),
+            restaurant_id,
+            distance,
+            get_wait_minutes(restaurant, orders_count),
+        ))
+    ranked.sort()
+    return [
+        (restaurant_id, distance, wait_minutes)
+        for _, restaurant_id, distance, wait_minutes in ranked[:limit]
+    ]
@@ -0,0 +1,68 @@
+import numpy as np
+from environs import Env
+from geopy import distance
+
+
+env = Env()
+env.read_env()
+
+DISTANCE_METHOD = env.str('DISTANCE_METHOD', 'haversine')
+EARTH_RADIUS_KM = 6371.0088
+
+
+def to_array(coordinates):
+    """Return (lat, lon) pairs as an N×2 float array."""
+    return np.asarray(coordinates, dtype=float).reshape(-1, 2)
+
+
+def haversine_matrix(origins, destinations):
+    origins = np.radians(to_array(origins))
+    destinations = np.radians(to_array(destinations))
+    lat1 = origins[:, 0, np.newaxis]
+    lon1 = origins[:, 1, np.newaxis]
+    lat2 = destinations[np.newaxis, :, 0]
+    lon2 = destinations[np.newaxis, :, 1]
+    a = (
+        np.sin((lat2 - lat1) / 2) ** 2
+        + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    )
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0, 1)))
+
+
+def equirectangular_matrix(origins, destinations):
+    origins = np.radians(to_array(origins))
+    destinations = np.radians(to_array(destinations))
+    lat1 = origins[:, 0, np.newaxis]
+    lon1 = origins[:, 1, np.newaxis]
+    lat2 = destinations[np.newaxis, :, 0]
+    lon2 = destinations[np.newaxis, :, 1]
+    x = (lon2 - lon1) * np.cos((lat1 + lat2) / 2)
+    y = lat2 - lat1
+    return EARTH_RADIUS_KM * np.hypot(x, y)
+
+
+def geodesic_matrix(origins, destinations):
+    origins = to_array(origins)
+    destinations = to_array(destinations)
+    matrix = np.empty((len(origins), len(destinations)))
+    for row, origin in enumerate(origins):
+        for column, destination in enumerate(destinations):
+            matrix[row, column] = distance.distance(origin, destination).km
+    return matrix
+
+
+DISTANCE_METHODS = {
+    'haversine': haversine_matrix,
+    'equirectangular': equirectangular_matrix,
+    'geodesic': geodesic_matrix,
+}
+
+
+def distance_matrix(origins, destinations, method=DISTANCE_METHOD):
+    """Return matrix of distances in km between every origin and destination.
+
+    Coordinates are (lat, lon) pairs. `haversine` and `equirectangular`
+    are computed in one vectorized pass, `geodesic` is exact but calls
+    geopy for every pair.
+    """
+    return DISTANCE_METHODS[method](origins, destinations)
@@ -0,0 +1,63 @@
+import hashlib
+import logging
+
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+from environs import Env
+
+from star_burger.caching import CacheNamespace
+
+
+env = Env()
+env.read_env()
+
+FRAGMENT_CACHE_ALIAS = env.str('FRAGMENT_CACHE_ALIAS', 'default')
+FRAGMENT_CACHE_TIMEOUT = env.int('FRAGMENT_CACHE_TIMEOUT', 24 * 60 * 60)
+
+fragment_cache = CacheNamespace(
+    'fragments',
+    alias=FRAGMENT_CACHE_ALIAS,
+    timeout=FRAGMENT_CACHE_TIMEOUT,
+)
+
+
+def get_fragment_key(template_name, version):
+    digest = hashlib.md5(repr(version).encode()).hexdigest()
+    return f'{template_name}:{digest}'
+
+
+def render_rows(template_name, rows):
+    """Render table rows, reusing the ones cached for the same version.
+
+    `rows` is a list of (version, context) pairs, where version is
+    anything whose repr changes together with the row, e.g. the object id
+    and its `updated_at`. All rows are read from the cache with one call
+    and only the missing ones are rendered. Returns rendered rows and a
+    dict with hit and miss counts.
+    """
+    keys = [get_fragment_key(template_name, version) for version, _ in rows]
+    cached_rows = fragment_cache.get_many(keys)
+
+    rendered_rows = []
+    new_rows = {}
+    for key, (_, context) in zip(keys, rows):
+        html = cached_rows.get(key)
+        if html is None:
+            html = new_rows.get(key) or render_to_string(
+                template_name,
+                context,
+            )
+            new_rows[key] = html
+        rendered_rows.append(mark_safe(html))
+    if new_rows:
+        fragment_cache.set_many(new_rows)
+
+    stats = {
+        'hits': len(rows) - len(new_rows),
+        'misses': len(new_rows),
+    }
+    logging.debug(
+        f'{template_name}: {stats["hits"]} rows from cache, '
+        f'{stats["misses"]} rendered'
+    )
+    return rendered_rows, stats
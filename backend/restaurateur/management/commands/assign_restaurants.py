@@ -0,0 +1,37 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from restaurateur.assignment import assign_restaurants
+
+
+class Command(BaseCommand):
+    help = 'Назначает новым заказам ближайший свободный ресторан'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=100,
+            help='Сколько заказов загружать из базы за раз',
+        )
+        parser.add_argument(
+            '--sleep',
+            type=float,
+            default=5,
+            help='Пауза в секундах между проходами',
+        )
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Распределить заказы один раз и завершиться',
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            assigned_count = assign_restaurants(options['batch_size'])
+            if assigned_count:
+                self.stdout.write(f'Назначено заказов: {assigned_count}')
+            if options['once']:
+                return
+            time.sleep(options['sleep'])
@@ -0,0 +1,43 @@
+import time
+
+import numpy as np
+from django.core.management.base import BaseCommand
+from geopy import distance
+
+from restaurateur.distances import distance_matrix
+
+
+class Command(BaseCommand):
+    help = 'Сравнивает скорость расчёта матрицы расстояний'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--orders', type=int, default=1000)
+        parser.add_argument('--restaurants', type=int, default=100)
+
+    def handle(self, *args, **options):
+        rng = np.random.default_rng(0)
+        center = np.array([55.75, 37.62])
+        orders = center + rng.uniform(-0.3, 0.3, (options['orders'], 2))
+        restaurants = center + rng.uniform(
+            -0.3, 0.3, (options['restaurants'], 2)
+        )
+
+        started_at = time.perf_counter()
+        pairwise = [
+            [distance.distance(order, restaurant).km
+             for restaurant in restaurants]
+            for order in orders
+        ]
+        self.report('geopy по парам', started_at)
+
+        exact = np.array(pairwise)
+        for method in ['haversine', 'equirectangular']:
+            started_at = time.perf_counter()
+            matrix = distance_matrix(orders, restaurants, method=method)
+            self.report(method, started_at)
+            error = np.abs(matrix - exact).max() * 1000
+            self.stdout.write(f'  макс. отклонение от geodesic: {error:.1f} м')
+
+    def report(self, name, started_at):
+        elapsed = time.perf_counter() - started_at
+        self.stdout.write(f'{name}: {elapsed * 1000:.1f} мс')
@@ -0,0 +1,38 @@
+from foodcartapp.availability import availability_cache
+from foodcartapp.models import ProductAvailability
+
+
+def build_availability():
+    summaries = (
+        ProductAvailability.objects
+        .filter(restaurants_count__gt=0)
+        .values_list('product_id', 'restaurant_ids')
+    )
+    return {
+        product_id: frozenset(restaurant_ids)
+        for product_id, restaurant_ids in summaries
+    }
+
+
+def load_availability():
+    """Return mapping of product id to ids of restaurants that sell it.
+
+    The whole availability matrix is fetched with a single query and kept
+    in the shared cache until availability summaries are refreshed, so
+    matching any number of orders costs at most one database round trip.
+    """
+    return availability_cache.get_or_set('matrix', build_availability)
+
+
+def find_restaurant_ids(product_ids, availability):
+    """Return ids of restaurants that can cook all of the products."""
+    restaurant_ids = None
+    for product_id in set(product_ids):
+        product_restaurants = availability.get(product_id, frozenset())
+        if restaurant_ids is None:
+            restaurant_ids = product_restaurants
+        else:
+            restaurant_ids = restaurant_ids & product_restaurants
+        if not restaurant_ids:
+            break
+    return restaurant_ids or frozenset()
@@ -0,0 +1,66 @@
+import base64
+import json
+
+from django.db import connections
+from django.utils.dateparse import parse_datetime
+
+
+# Same columns in the same order as the order_board_idx index.
+KEYSET_FIELDS = ['status', 'registered_at', 'id']
+
+
+def encode_cursor(order):
+    """Return opaque cursor pointing right after the order."""
+    position = [order.status, order.registered_at.isoformat(), order.id]
+    return base64.urlsafe_b64encode(json.dumps(position).encode()).decode()
+
+
+def decode_cursor(cursor):
+    try:
+        status, registered_at, order_id = json.loads(
+            base64.urlsafe_b64decode(cursor.encode())
+        )
+        registered_at = parse_datetime(registered_at)
+    except (TypeError, ValueError):
+        return None
+    if not registered_at or not isinstance(order_id, int):
+        return None
+    return status, registered_at, order_id
+
+
+def filter_after(orders, position):
+    """Return orders that go after the position in keyset order.
+
+    The condition is a single row value comparison, which PostgreSQL and
+    SQLite turn into one range scan of the index. An OR of the same
+    conditions is planned as a filter or a bitmap scan instead.
+    """
+    connection = connections[orders.db]
+    quote_name = connection.ops.quote_name
+    fields = [orders.model._meta.get_field(name) for name in KEYSET_FIELDS]
+    columns = ', '.join(
+        f'{quote_name(orders.model._meta.db_table)}.{quote_name(field.column)}'
+        for field in fields
+    )
+    params = [
+        field.get_db_prep_value(value, connection)
+        for field, value in zip(fields, position)
+    ]
+    return orders.extra(where=[f'({columns}) > (%s, %s, %s)'], params=params)
+
+
+def paginate_orders(orders, cursor, page_size):
+    """Return page of orders after cursor and the cursor of the next page.
+
+    Orders are walked by (status, registered_at, id), so every page is an
+    index range scan no matter how deep it is.
+    """
+    orders = orders.order_by(*KEYSET_FIELDS)
+    position = decode_cursor(cursor) if cursor else None
+    if position:
+        orders = filter_after(orders, position)
+    page = list(orders[:page_size + 1])
+    if len(page) > page_size:
+        page = page[:page_size]
+        return page, encode_cursor(page[-1])
+    return page, None
@@ -0,0 +1,33 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from foodcartapp.models import Order, Restaurant
+from geocode.models import GeoCode
+
+from .capacity import invalidate_kitchen_load
+from .spatial import restaurant_index
+
+
+@receiver(post_save, sender=Restaurant)
+def reindex_restaurant(sender, instance, **kwargs):
+    restaurant_index.update(instance)
+
+
+@receiver(post_delete, sender=Restaurant)
+def unindex_restaurant(sender, instance, **kwargs):
+    restaurant_index.remove(instance.id)
+
+
+@receiver(post_save, sender=GeoCode)
+def reindex_geocode_restaurants(sender, instance, created, **kwargs):
+    if created:
+        return
+    for restaurant in instance.restaurants.all():
+        restaurant.geo = instance
+        restaurant_index.update(restaurant)
+
+
+@receiver(post_save, sender=Order)
+@receiver(post_delete, sender=Order)
+def reset_kitchen_load(sender, **kwargs):
+    invalidate_kitchen_load()
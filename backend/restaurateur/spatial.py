@@ -0,0 +1,244 @@
+import math
+from collections import defaultdict
+from threading import RLock
+
+import numpy as np
+
+from foodcartapp.models import Restaurant
+from star_burger.caching import CacheNamespace
+
+from .distances import DISTANCE_METHOD, EARTH_RADIUS_KM, distance_matrix
+
+
+KM_PER_DEGREE = EARTH_RADIUS_KM * math.pi / 180
+BRUTE_FORCE_LIMIT = 64
+
+index_cache = CacheNamespace('restaurant-index')
+
+
+def get_index_version():
+    return index_cache.get_version()
+
+
+def bump_index_version():
+    """Mark restaurant indexes of all processes as stale."""
+    return index_cache.invalidate()
+
+
+class RestaurantIndex:
+    """Grid index over restaurant coordinates for nearest-kitchen queries.
+
+    Restaurants are bucketed into square cells of `cell_size` degrees, and
+    queries scan rings of cells around the origin until the remaining
+    cells can not contain anything closer than the found restaurants.
+    Distances are measured with `distance_method`, see DISTANCE_METHODS.
+    """
+
+    def __init__(self, cell_size=0.05, distance_method=DISTANCE_METHOD):
+        self.cell_size = cell_size
+        self.distance_method = distance_method
+        self._lock = RLock()
+        self._cells = defaultdict(dict)
+        self._locations = {}
+        self._bounds = None
+        self._version = None
+
+    def _get_cell(self, lat, lon):
+        return (
+            math.floor(lat / self.cell_size),
+            math.floor(lon / self.cell_size),
+        )
+
+    def _put(self, restaurant_id, lat, lon):
+        cell = self._get_cell(lat, lon)
+        self._cells[cell][restaurant_id] = (lat, lon)
+        self._locations[restaurant_id] = (lat, lon)
+        if self._bounds is None:
+            self._bounds = [cell[0], cell[0], cell[1], cell[1]]
+        else:
+            self._bounds = [
+                min(self._bounds[0], cell[0]),
+                max(self._bounds[1], cell[0]),
+                min(self._bounds[2], cell[1]),
+                max(self._bounds[3], cell[1]),
+            ]
+
+    def _discard(self, restaurant_id):
+        location = self._locations.pop(restaurant_id, None)
+        if location is None:
+            return
+        cell = self._get_cell(*location)
+        self._cells[cell].pop(restaurant_id, None)
+        if not self._cells[cell]:
+            del self._cells[cell]
+
+    def rebuild(self):
+        with self._lock:
+            version = get_index_version()
+            self._cells = defaultdict(dict)
+            self._locations = {}
+            self._bounds = None
+            restaurants = (
+                Restaurant.objects
+                .filter(geo__lat__isnull=False, geo__lon__isnull=False)
+                .values_list('id', 'geo__lat', 'geo__lon')
+            )
+            for restaurant_id, lat, lon in restaurants:
+                self._put(restaurant_id, lat, lon)
+            self._version = version
+
+    def ensure_fresh(self):
+        if self._version is None or self._version != get_index_version():
+            self.rebuild()
+
+    def _mark_changed(self):
+        fresh = (
+            self._version is not None
+            and self._version == get_index_version()
+        )
+        version = bump_index_version()
+        self._version = version if fresh else None
+
+    def update(self, restaurant):
+        """Reindex a single restaurant after it or its GeoCode changed."""
+        with self._lock:
+            self._discard(restaurant.id)
+            geo = restaurant.geo
+            if geo and geo.lat is not None and geo.lon is not None:
+                self._put(restaurant.id, geo.lat, geo.lon)
+            self._mark_changed()
+
+    def remove(self, restaurant_id):
+        with self._lock:
+            self._discard(restaurant_id)
+            self._mark_changed()
+
+    def _iter_ring(self, center, radius):
+        row, column = center
+        if radius == 0:
+            yield center
+            return
+        for shift in range(-radius, radius + 1):
+            yield row - radius, column + shift
+            yield row + radius, column + shift
+        for shift in range(-radius + 1, radius):
+            yield row + shift, column - radius
+            yield row + shift, column + radius
+
+    def _rank(self, lat, lon, candidates, k):
+        if not candidates:
+            return []
+        restaurant_ids = list(candidates)
+        distances = distance_matrix(
+            [(lat, lon)],
+            [candidates[restaurant_id] for restaurant_id in restaurant_ids],
+            method=self.distance_method,
+        )[0]
+        ranked = sorted(
+            zip(restaurant_ids, distances.tolist()),
+            key=lambda item: item[1],
+        )
+        return ranked[:k] if k else ranked
+
+    def nearest(self, lat, lon, k=None, restaurant_ids=None):
+        """Return up to k (restaurant id, km) pairs ordered by distance.
+
+        When `restaurant_ids` is given, only those restaurants are
+        considered, e.g. the ones that have the whole cart available.
+        """
+        self.ensure_fresh()
+        with self._lock:
+            if restaurant_ids is not None:
+                restaurant_ids = set(restaurant_ids)
+            if not k or (
+                restaurant_ids is not None
+                and len(restaurant_ids) <= max(k, BRUTE_FORCE_LIMIT)
+            ):
+                if restaurant_ids is None:
+                    candidates = self._locations
+                else:
+                    candidates = {
+                        restaurant_id: self._locations[restaurant_id]
+                        for restaurant_id in restaurant_ids
+                        if restaurant_id in self._locations
+                    }
+                return self._rank(lat, lon, candidates, k)
+
+            if self._bounds is None:
+                return []
+            center = self._get_cell(lat, lon)
+            max_radius = max(
+                abs(center[0] - self._bounds[0]),
+                abs(center[0] - self._bounds[1]),
+                abs(center[1] - self._bounds[2]),
+                abs(center[1] - self._bounds[3]),
+            )
+            candidates = {}
+            for radius in range(max_radius + 1):
+                for cell in self._iter_ring(center, radius):
+                    for restaurant_id, location in self._cells.get(
+                        cell, {}
+                    ).items():
+                        if (
+                            restaurant_ids is None
+                            or restaurant_id in restaurant_ids
+                        ):
+                            candidates[restaurant_id] = location
+                if len(candidates) < k:
+                    continue
+                ranked = self._rank(lat, lon, candidates, k)
+                outer_lat = min(abs(lat) + (radius + 1) * self.cell_size, 89)
+                closest_outside = (
+                    radius * self.cell_size * KM_PER_DEGREE
+                    * math.cos(math.radians(outer_lat))
+                )
+                if ranked[-1][1] <= closest_outside:
+                    return ranked
+            return self._rank(lat, lon, candidates, k)
+
+    def nearest_many(self, points, k=None, restaurant_ids=None):
+        """Return nearest (restaurant id, km) pairs for every (lat, lon) point.
+
+        Distances from all points to the restaurants any of them may use
+        are measured as one distance matrix, so a page of orders costs a
+        single vectorized call. `restaurant_ids` lists allowed ids for
+        every point, like in nearest().
+        """
+        self.ensure_fresh()
+        if restaurant_ids is None:
+            restaurant_ids = [None] * len(points)
+        with self._lock:
+            if None in restaurant_ids:
+                column_ids = list(self._locations)
+            else:
+                column_ids = sorted(
+                    set().union(*restaurant_ids) & self._locations.keys()
+                )
+            locations = [
+                self._locations[restaurant_id] for restaurant_id in column_ids
+            ]
+        if not points or not column_ids:
+            return [[] for _ in points]
+        matrix = distance_matrix(
+            points, locations, method=self.distance_method,
+        )
+        column_ids = np.array(column_ids)
+        results = []
+        for distances, allowed_ids in zip(matrix, restaurant_ids):
+            ids = column_ids
+            if allowed_ids is not None:
+                allowed = np.isin(column_ids, list(allowed_ids))
+                ids, distances = column_ids[allowed], distances[allowed]
+            if k and k < len(distances):
+                selected = np.argpartition(distances, k - 1)[:k]
+            else:
+                selected = np.arange(len(distances))
+            selected = selected[np.argsort(distances[selected], kind='stable')]
+            results.append(list(zip(
+                ids[selected].tolist(),
+                distances[selected].tolist(),
+            )))
+        return results
+
+
+restaurant_index = RestaurantIndex()
@@ -1,3 +1,615 @@
-from django.test import TestCase
+import json
+import os
+import tempfile
+from io import StringIO
+from threading import BoundedSemaphore
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from foodcartapp.availability import refresh_availability
+from foodcartapp.geocoding import MAX_ATTEMPTS, claim_tasks
+from foodcartapp.models import (
+    Order,
+    OrderGeocodeTask,
+    OrderProduct,
+    Product,
+    Restaurant,
+    RestaurantMenuItem,
+)
+from geocode.models import GeoCode
+from star_burger import storage
+
+from .assignment import assign_restaurants
+from .capacity import get_kitchen_load, get_wait_minutes, rank_restaurants
+from .distances import distance_matrix
+from .matching import find_restaurant_ids, load_availability
+from .pagination import (
+    KEYSET_FIELDS,
+    decode_cursor,
+    encode_cursor,
+    filter_after,
+)
+from .spatial import RestaurantIndex, index_cache, restaurant_index
+
+
+class MatchingTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.burger = Product.objects.create(name='Бургер', price=100)
+        cls.fries = Product.objects.create(name='Картошка', price=50)
+        cls.first = Restaurant.objects.create(name='Первый')
+        cls.second = Restaurant.objects.create(name='Второй')
+        RestaurantMenuItem.objects.create(
+            restaurant=cls.first, product=cls.burger,
+        )
+        RestaurantMenuItem.objects.create(
+            restaurant=cls.first, product=cls.fries,
+        )
+        RestaurantMenuItem.objects.create(
+            restaurant=cls.second, product=cls.burger,
+        )
+        RestaurantMenuItem.objects.create(
+            restaurant=cls.second, product=cls.fries, availability=False,
+        )
+        refresh_availability()
+
+    def test_intersection(self):
+        availability = load_availability()
+        self.assertEqual(
+            find_restaurant_ids([self.burger.id], availability),
+            {self.first.id, self.second.id},
+        )
+        self.assertEqual(
+            find_restaurant_ids([self.burger.id, self.fries.id], availability),
+            {self.first.id},
+        )
+        self.assertEqual(find_restaurant_ids([], availability), set())
+
+
+class UpdateAvailabilityTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.manager = get_user_model().objects.create_user(
+            username='manager', password='password', is_staff=True,
+        )
+        cls.bun = Product.objects.create(name='Булка', price=10)
+        cls.burger = Product.objects.create(name='Бургер', price=100)
+        cls.first = Restaurant.objects.create(name='Первый')
+        cls.second = Restaurant.objects.create(name='Второй')
+        for restaurant in [cls.first, cls.second]:
+            RestaurantMenuItem.objects.create(
+                restaurant=restaurant, product=cls.bun,
+            )
+        refresh_availability()
+
+    def post(self, data):
+        self.client.force_login(self.manager)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(
+                reverse('restaurateur:update_availability'),
+                data,
+                content_type='application/json',
+            )
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_toggles_row_and_column(self):
+        self.assertEqual(
+            self.post({'available': False, 'products': [self.bun.id]}),
+            {'changed': 2},
+        )
+        self.assertEqual(load_availability(), {})
+
+        self.assertEqual(
+            self.post({'available': True, 'restaurants': [self.first.id]}),
+            {'changed': 2},
+        )
+        self.assertEqual(load_availability(), {
+            self.bun.id: {self.first.id},
+            self.burger.id: {self.first.id},
+        })
+
+    def test_requires_products_or_restaurants(self):
+        self.client.force_login(self.manager)
+        response = self.client.post(
+            reverse('restaurateur:update_availability'),
+            {'available': True},
+            content_type='application/json',
+        )
+        self.assertEqual(response.status_code, 400)
+
+
+class DistanceMatrixTest(TestCase):
+    def test_methods_agree_with_geodesic(self):
+        orders = [(55.75, 37.62), (55.80, 37.50), (55.60, 37.70)]
+        restaurants = [(55.70, 37.60), (55.85, 37.40)]
+        exact = distance_matrix(orders, restaurants, method='geodesic')
+        for method in ['haversine', 'equirectangular']:
+            matrix = distance_matrix(orders, restaurants, method=method)
+            self.assertEqual(matrix.shape, (3, 2))
+            self.assertLess(abs(matrix - exact).max(), 0.1)
+
+    def test_empty(self):
+        self.assertEqual(distance_matrix([], [(55.7, 37.6)]).shape, (0, 1))
+
+
+class RestaurantIndexTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.restaurants = [
+            Restaurant.objects.create(
+                name=f'Ресторан {number}',
+                geo=GeoCode.objects.create(
+                    address=f'Ресторан {number}',
+                    lat=55.5 + number * 0.01,
+                    lon=37.5 + (number % 7) * 0.03,
+                ),
+            )
+            for number in range(100)
+        ]
+
+    def test_nearest_matches_brute_force(self):
+        index = RestaurantIndex(cell_size=0.02)
+        expected = distance_matrix(
+            [(55.9, 37.6)],
+            [(item.geo.lat, item.geo.lon) for item in self.restaurants],
+        )[0].argsort()[:5]
+        nearest = index.nearest(55.9, 37.6, k=5)
+        self.assertEqual(
+            [restaurant_id for restaurant_id, _ in nearest],
+            [self.restaurants[position].id for position in expected],
+        )
+
+    def test_nearest_many_matches_nearest(self):
+        index = RestaurantIndex(cell_size=0.02)
+        points = [(55.9, 37.6), (55.5, 37.5), (56.0, 37.7)]
+        restaurant_ids = [
+            None,
+            {item.id for item in self.restaurants[::3]},
+            {self.restaurants[5].id, 0},
+        ]
+        with mock.patch(
+            'restaurateur.spatial.distance_matrix', wraps=distance_matrix,
+        ) as matrix:
+            nearest_many = index.nearest_many(
+                points, k=5, restaurant_ids=restaurant_ids,
+            )
+        self.assertEqual(matrix.call_count, 1)
+        for (lat, lon), ids, nearest in zip(
+            points, restaurant_ids, nearest_many,
+        ):
+            expected = index.nearest(lat, lon, k=5, restaurant_ids=ids)
+            self.assertEqual(
+                [restaurant_id for restaurant_id, _ in nearest],
+                [restaurant_id for restaurant_id, _ in expected],
+            )
+            for (_, distance), (_, expected_distance) in zip(
+                nearest, expected,
+            ):
+                self.assertAlmostEqual(distance, expected_distance)
+
+    def test_ranking_prunes_far_restaurants(self):
+        restaurants = {item.id: item for item in self.restaurants}
+        expected = distance_matrix(
+            [(55.9, 37.6)],
+            [(item.geo.lat, item.geo.lon) for item in self.restaurants],
+        )[0].argsort()[:3]
+        restaurant_index.ensure_fresh()
+        with mock.patch.object(
+            restaurant_index, '_rank', wraps=restaurant_index._rank,
+        ) as rank:
+            ranked = rank_restaurants(
+                55.9,
+                37.6,
+                restaurants,
+                restaurant_ids=list(restaurants),
+                load={},
+                limit=3,
+            )
+        self.assertEqual(
+            [restaurant_id for restaurant_id, _, _ in ranked],
+            [self.restaurants[position].id for position in expected],
+        )
+        ranked_candidates = max(len(call.args[2]) for call in rank.mock_calls)
+        self.assertLess(ranked_candidates, len(self.restaurants))
+
+    def test_distance_method_is_used(self):
+        haversine = RestaurantIndex(distance_method='haversine')
+        geodesic = RestaurantIndex(distance_method='geodesic')
+        expected = distance_matrix(
+            [(55.9, 37.6)],
+            [(item.geo.lat, item.geo.lon) for item in self.restaurants],
+            method='geodesic',
+        )[0].min()
+        _, distance = geodesic.nearest(55.9, 37.6, k=1)[0]
+        self.assertAlmostEqual(distance, expected)
+        self.assertNotAlmostEqual(
+            distance, haversine.nearest(55.9, 37.6, k=1)[0][1], places=4,
+        )
+
+    def test_rebuilds_after_restaurant_change(self):
+        index = RestaurantIndex()
+        index.ensure_fresh()
+        restaurant = self.restaurants[0]
+        restaurant.geo = GeoCode.objects.create(
+            address='Далеко', lat=60.0, lon=30.0,
+        )
+        restaurant.save()
+        with self.assertNumQueries(1):
+            nearest = index.nearest(
+                60.0, 30.0, k=1, restaurant_ids=[restaurant.id],
+            )
+        self.assertEqual(nearest[0][0], restaurant.id)
+        self.assertAlmostEqual(nearest[0][1], 0)
+
+    def test_rebuilds_after_version_is_lost(self):
+        index = RestaurantIndex()
+        index.ensure_fresh()
+        index_cache.cache.delete(index_cache.version_key)
+        with self.assertNumQueries(1):
+            index.ensure_fresh()
+
+
+class OrdersBoardTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.manager = get_user_model().objects.create_user(
+            username='manager', password='password', is_staff=True,
+        )
+        cls.products = [
+            Product.objects.create(name=f'Товар {number}', price=100)
+            for number in range(5)
+        ]
+        for number in range(3):
+            restaurant = Restaurant.objects.create(
+                name=f'Ресторан {number}',
+                address=f'Москва, ресторан {number}',
+                geo=GeoCode.objects.create(
+                    address=f'Москва, ресторан {number}',
+                    lon=37.6 + number / 100,
+                    lat=55.7,
+                ),
+            )
+            for product in cls.products:
+                RestaurantMenuItem.objects.create(
+                    restaurant=restaurant, product=product,
+                )
+        refresh_availability()
+
+    def create_orders(self, count):
+        start = Order.objects.count()
+        for number in range(start, start + count):
+            order = Order.objects.create(
+                firstname='Иван',
+                phonenumber='+79991234567',
+                address=f'Москва, заказ {number}',
+                status='1_manager',
+                payment='cash',
+                geo=GeoCode.objects.create(
+                    address=f'Москва, заказ {number}',
+                    lon=37.5,
+                    lat=55.6 + number / 1000,
+                ),
+            )
+            for product in self.products:
+                OrderProduct.objects.create(
+                    order=order, product=product, price=product.price,
+                )
+
+
+class ViewOrdersQueryBudgetTest(OrdersBoardTestCase):
+    def get_orders_page(self):
+        self.client.force_login(self.manager)
+        restaurant_index.ensure_fresh()
+        load_availability()
+        get_kitchen_load()
+        with self.assertNumQueries(5):
+            response = self.client.get(reverse('restaurateur:view_orders'))
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def test_query_count_does_not_depend_on_orders(self):
+        self.create_orders(1)
+        self.get_orders_page()
+        self.create_orders(20)
+        response = self.get_orders_page()
+        self.assertEqual(len(response.context['order_items']), 21)
+
+    @mock.patch('geocode.geocoder.fetch_coordinates')
+    def test_board_queues_unknown_addresses(self, fetch_coordinates):
+        self.create_orders(2)
+        known_geo = GeoCode.objects.create(
+            address='Москва, Арбат 1',
+            normalized_address='москва арбат 1',
+            lat=55.75,
+            lon=37.59,
+        )
+        order, unknown_order = Order.objects.all()[:2]
+        Order.objects.filter(id=order.id).update(
+            geo=None, address='Москва, Арбат 1',
+        )
+        Order.objects.filter(id=unknown_order.id).update(
+            geo=None, address='Нигде',
+        )
+        self.client.force_login(self.manager)
+        response = self.client.get(reverse('restaurateur:view_orders'))
+        self.assertEqual(response.status_code, 200)
+        fetch_coordinates.assert_not_called()
+        order.refresh_from_db()
+        self.assertEqual(order.geo, known_geo)
+        self.assertEqual(
+            list(OrderGeocodeTask.objects.values_list('order', flat=True)),
+            [unknown_order.id],
+        )
+
+    def test_board_does_not_requeue_failed_addresses(self):
+        self.create_orders(1)
+        order = Order.objects.get()
+        Order.objects.filter(id=order.id).update(geo=None, address='Нигде')
+        failed_at = timezone.now()
+        OrderGeocodeTask.objects.create(
+            order=order,
+            attempts=MAX_ATTEMPTS,
+            failed_at=failed_at,
+        )
+        self.client.force_login(self.manager)
+        response = self.client.get(reverse('restaurateur:view_orders'))
+        self.assertEqual(response.status_code, 200)
+        task = OrderGeocodeTask.objects.get()
+        self.assertEqual(task.attempts, MAX_ATTEMPTS)
+        self.assertEqual(task.failed_at, failed_at)
+        self.assertEqual(claim_tasks(batch_size=10), [])
+
+    def test_board_measures_distances_once_per_page(self):
+        self.create_orders(4)
+        self.client.force_login(self.manager)
+        restaurant_index.rebuild()
+        with mock.patch(
+            'restaurateur.spatial.distance_matrix', wraps=distance_matrix,
+        ) as matrix:
+            response = self.client.get(reverse('restaurateur:view_orders'))
+        self.assertEqual(matrix.call_count, 1)
+        self.assertEqual(len(matrix.call_args.args[0]), 4)
+        for _, candidates, _ in response.context['order_items']:
+            self.assertEqual(len(candidates), 3)
+
+    def test_board_counts_restaurants_beyond_ranked(self):
+        self.create_orders(1)
+        self.client.force_login(self.manager)
+        with mock.patch('restaurateur.views.RANKED_RESTAURANTS', 2):
+            response = self.client.get(reverse('restaurateur:view_orders'))
+        [(order, candidates, more_candidates)] = (
+            response.context['order_items']
+        )
+        self.assertEqual(len(candidates), 2)
+        self.assertEqual(more_candidates, 1)
+        self.assertContains(
+            response, 'и ещё 1, дольше по времени доставки',
+        )
+
+    def test_unchanged_rows_come_from_cache(self):
+        self.create_orders(3)
+        self.get_orders_page()
+        order = Order.objects.first()
+        order.comment = 'Позвонить заранее'
+        order.save()
+        response = self.get_orders_page()
+        self.assertEqual(
+            response.context['fragment_stats'],
+            {'hits': 2, 'misses': 1},
+        )
+        self.assertContains(response, 'Позвонить заранее')
+
+    def test_keyset_pages_cover_all_orders(self):
+        self.create_orders(7)
+        self.client.force_login(self.manager)
+        url = reverse('restaurateur:view_orders')
+        query = ''
+        seen_ids = []
+        with mock.patch('restaurateur.views.ORDERS_PAGE_SIZE', 3):
+            while query is not None:
+                response = self.client.get(f'{url}?{query}')
+                seen_ids += [
+                    order.id
+                    for order, _, _ in response.context['order_items']
+                ]
+                query = response.context['next_page_query']
+        self.assertEqual(
+            seen_ids,
+            list(
+                Order.objects
+                .order_by('status', 'registered_at', 'id')
+                .values_list('id', flat=True)
+            ),
+        )
+
+    def test_keyset_page_is_an_index_range_scan(self):
+        self.create_orders(3)
+        first = Order.objects.order_by(*KEYSET_FIELDS).first()
+        orders = filter_after(
+            Order.objects.order_by(*KEYSET_FIELDS),
+            decode_cursor(encode_cursor(first)),
+        )
+        self.assertIn(
+            '("foodcartapp_order"."status", '
+            '"foodcartapp_order"."registered_at", '
+            '"foodcartapp_order"."id") > (',
+            str(orders.query),
+        )
+        self.assertNotIn(' OR ', str(orders.query))
+        self.assertIn('order_board_idx', orders.explain())
+        self.assertEqual(len(orders), 2)
+
+    def test_export_streams_orders_with_products(self):
+        self.create_orders(3)
+        self.client.force_login(self.manager)
+        response = self.client.get(reverse('restaurateur:export_orders'))
+        self.assertTrue(response.streaming)
+        orders = json.loads(b''.join(response.streaming_content))
+        self.assertEqual(
+            [order['id'] for order in orders],
+            sorted(Order.objects.values_list('id', flat=True)),
+        )
+        self.assertEqual(
+            [line['product_id'] for line in orders[0]['products']],
+            [product.id for product in self.products],
+        )
+        self.assertEqual(orders[0]['phonenumber'], '+79991234567')
+
+
+class OrderUpdatesTest(OrdersBoardTestCase):
+    def read_stream(self, timeout=0, **kwargs):
+        self.client.force_login(self.manager)
+        with mock.patch('restaurateur.views.ORDER_UPDATES_TIMEOUT', timeout):
+            response = self.client.get(
+                reverse('restaurateur:order_updates'), **kwargs,
+            )
+            self.assertEqual(response.status_code, 200)
+            return [chunk.decode() for chunk in response.streaming_content]
+
+    def read_events(self, **kwargs):
+        retry, *events = self.read_stream(**kwargs)
+        self.assertEqual(retry, 'retry: 1000\n\n')
+        return events
+
+    def test_resumes_after_last_event_id(self):
+        self.create_orders(2)
+        first, second = Order.objects.order_by('updated_at')
+        [event] = self.read_events(
+            HTTP_LAST_EVENT_ID=first.updated_at.isoformat(),
+        )
+        self.assertIn(f'id: {second.updated_at.isoformat()}\n', event)
+        self.assertIn(f'"id": {second.id}', event)
+
+    def test_invalid_since_starts_from_now(self):
+        self.create_orders(1)
+        for since in ['2020-13-45T00:00:00', 'вчера']:
+            self.assertEqual(
+                self.read_events(data={'since': since}),
+                [': keep-alive\n\n'],
+            )
+        self.assertEqual(
+            self.read_events(HTTP_LAST_EVENT_ID='2020-13-45T00:00:00'),
+            [': keep-alive\n\n'],
+        )
+
+    @mock.patch('restaurateur.views.time.sleep')
+    def test_ends_on_first_changes(self, sleep):
+        since = timezone.now()
+        sleep.side_effect = lambda seconds: self.create_orders(1)
+        retry, event = self.read_stream(
+            timeout=60, data={'since': since.isoformat()},
+        )
+        self.assertIn('event: order\n', event)
+        self.assertEqual(sleep.call_count, 1)
+
+    @mock.patch('restaurateur.views.find_geocodes')
+    def test_does_not_geocode_or_enqueue(self, find_geocodes):
+        since = timezone.now()
+        order = Order.objects.create(
+            firstname='Иван',
+            phonenumber='+79991234567',
+            address='Москва, новый адрес',
+        )
+        [event] = self.read_events(data={'since': since.isoformat()})
+        self.assertIn(f'"id": {order.id}', event)
+        find_geocodes.assert_not_called()
+        self.assertFalse(OrderGeocodeTask.objects.exists())
+
+    def test_streams_are_capped(self):
+        with mock.patch(
+            'restaurateur.views.order_update_streams', BoundedSemaphore(1),
+        ) as streams:
+            streams.acquire()
+            self.assertEqual(
+                self.read_stream(), ['retry: 5000\n\n'],
+            )
+            streams.release()
+            self.assertEqual(
+                self.read_events(), [': keep-alive\n\n'],
+            )
+
+
+class AssignRestaurantsTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.burger = Product.objects.create(name='Бургер', price=100)
+        cls.restaurants = []
+        for number, lon in enumerate([37.60, 37.61, 37.90]):
+            restaurant = Restaurant.objects.create(
+                name=f'Ресторан {number}',
+                capacity=1,
+                geo=GeoCode.objects.create(
+                    address=f'Ресторан {number}', lat=55.7, lon=lon,
+                ),
+            )
+            RestaurantMenuItem.objects.create(
+                restaurant=restaurant, product=cls.burger,
+            )
+            cls.restaurants.append(restaurant)
+        refresh_availability()
+
+    def create_order(self, number):
+        order = Order.objects.create(
+            firstname='Иван',
+            phonenumber='+79991234567',
+            address=f'Заказ {number}',
+            status='1_manager',
+            payment='cash',
+            geo=GeoCode.objects.create(
+                address=f'Заказ {number}',
+                lat=55.7,
+                lon=37.599 - number / 10000,
+            ),
+        )
+        OrderProduct.objects.create(order=order, product=self.burger)
+        return order
+
+    def test_wait_grows_past_capacity(self):
+        restaurant = Restaurant(capacity=2, cooking_minutes=20)
+        self.assertEqual(get_wait_minutes(restaurant, 1), 0)
+        self.assertEqual(get_wait_minutes(restaurant, 2), 10)
+        self.assertEqual(get_wait_minutes(restaurant, 5), 40)
+
+    def test_balances_load_between_near_kitchens(self):
+        orders = [self.create_order(number) for number in range(4)]
+        self.assertEqual(assign_restaurants(batch_size=3), 4)
+        assigned = Order.objects.filter(id__in=[o.id for o in orders])
+        self.assertEqual(set(assigned.values_list('status', flat=True)), {
+            '2_cooking',
+        })
+        self.assertEqual(
+            set(assigned.values_list('restaurant', flat=True)),
+            {self.restaurants[0].id, self.restaurants[1].id},
+        )
+
+
+class CollectStaticTest(SimpleTestCase):
+    def test_assets_are_fingerprinted_and_compressed(self):
+        with tempfile.TemporaryDirectory() as static_root:
+            with override_settings(
+                STATIC_ROOT=static_root,
+                STATICFILES_STORAGE=(
+                    'star_burger.storage.CompressedManifestStaticFilesStorage'
+                ),
+            ):
+                call_command(
+                    'collectstatic',
+                    interactive=False,
+                    verbosity=0,
+                    stdout=StringIO(),
+                )
+            with open(os.path.join(static_root, 'staticfiles.json')) as file:
+                hashed_name = json.load(file)['paths']['admin/css/base.css']
+            self.assertRegex(
+                hashed_name, r'^admin/css/base\.[0-9a-f]{12}\.css$',
+            )
+            hashed_path = os.path.join(static_root, hashed_name)
+            extensions = ['gz', 'br'] if storage.brotli else ['gz']
+            for extension in extensions:
+                self.assertTrue(os.path.exists(f'{hashed_path}.{extension}'))
@@ -9,11 +9,24 @@ urlpatterns = [
     path('', lambda request: redirect('restaurateur:ProductsView')),
 
     path('products/', views.view_products, name="ProductsView"),
+    path(
+        'products/availability/',
+        views.update_availability,
+        name="update_availability",
+    ),
 
     path('restaurants/', views.view_restaurants, name="RestaurantView"),
 
     # TODO заглушка для нереализованного функционала
     path('orders/', views.view_orders, name="view_orders"),
+    path('orders/export/', views.export_orders, name="export_orders"),
+    path(
+        'orders/updates/',
+        views.stream_order_updates,
+        name="order_updates",
+    ),
+
+    path('cache/stats/', views.view_cache_stats, name="cache_stats"),
 
     path('login/', views.LoginView.as_view(), name="login"),
     path('logout/', views.LogoutView.as_view(), name="logout"),
@@ -1,23 +1,58 @@
+import json
 import logging
+import time
+from threading import BoundedSemaphore
+from urllib.parse import urlencode
 
-import requests
 from django import forms
+from django.conf import settings
+from django.http import JsonResponse, StreamingHttpResponse
 from django.shortcuts import redirect, render
+from django.template.loader import render_to_string
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
 from django.views import View
-from django.urls import reverse_lazy
+from django.views.decorators.http import require_POST
+from django.urls import reverse, reverse_lazy
 from django.contrib.auth.decorators import user_passes_test
 from django.contrib.auth import authenticate, login
 from django.contrib.auth import views as auth_views
 from environs import Env
-from geopy import distance
 
-from foodcartapp.models import Order, Product, Restaurant
-from geocode.models import GeoCode
+from foodcartapp.availability import set_availability
+from foodcartapp.export import iter_orders_export
+from foodcartapp.geocoding import enqueue_geocoding_many
+from foodcartapp.models import (
+    Order,
+    Product,
+    ProductAvailability,
+    Restaurant,
+)
+from foodcartapp.streaming import stream_json_list
+from geocode.geocoder import find_geocodes, normalize_address
+from star_burger.caching import cache_stats, namespaces
+
+from .capacity import (
+    RANKED_RESTAURANTS,
+    get_kitchen_load,
+    rank_restaurants_many,
+)
+from .fragments import render_rows
+from .matching import find_restaurant_ids, load_availability
+from .pagination import paginate_orders
 
 
 env = Env()
 env.read_env()
 
+ORDERS_PAGE_SIZE = env.int('ORDERS_PAGE_SIZE', 50)
+ORDER_UPDATES_TIMEOUT = env.int('ORDER_UPDATES_TIMEOUT', 10)
+ORDER_UPDATES_POLL_INTERVAL = env.float('ORDER_UPDATES_POLL_INTERVAL', 2)
+ORDER_UPDATES_MAX_STREAMS = env.int('ORDER_UPDATES_MAX_STREAMS', 2)
+ORDER_UPDATES_BUSY_RETRY = 5000
+
+order_update_streams = BoundedSemaphore(ORDER_UPDATES_MAX_STREAMS)
+
 logging.basicConfig(
     format="%(process)d %(levelname)s %(message)s",
     level=logging.INFO
@@ -41,6 +76,29 @@ class Login(forms.Form):
     )
 
 
+class AvailabilityForm(forms.Form):
+    available = forms.BooleanField(required=False)
+    products = forms.ModelMultipleChoiceField(
+        queryset=Product.objects.all(),
+        required=False,
+    )
+    restaurants = forms.ModelMultipleChoiceField(
+        queryset=Restaurant.objects.all(),
+        required=False,
+    )
+
+    def clean(self):
+        cleaned_data = super().clean()
+        if 'products' not in self.data and 'restaurants' not in self.data:
+            raise forms.ValidationError('Укажите товары или рестораны')
+        return cleaned_data
+
+    def get_ids(self, field_name):
+        if field_name not in self.data:
+            return None
+        return [item.id for item in self.cleaned_data[field_name]]
+
+
 class LoginView(View):
     def get(self, request, *args, **kwargs):
         form = Login()
@@ -79,136 +137,387 @@ def is_manager(user):
 @user_passes_test(is_manager, login_url='restaurateur:login')
 def view_products(request):
     restaurants = list(Restaurant.objects.order_by('name'))
-    products = list(Product.objects.prefetch_related('menu_items'))
+    products = list(
+        Product.objects.select_related('availability_summary', 'category')
+    )
 
-    products_with_restaurant_availability = []
+    rows = []
     for product in products:
-        availability = {
-            item.restaurant_id: item.availability
-            for item
-            in product.menu_items.all()
-        }
+        try:
+            available_ids = set(product.availability_summary.restaurant_ids)
+        except ProductAvailability.DoesNotExist:
+            available_ids = set()
         ordered_availability = [
-            availability.get(restaurant.id, False)
+            (restaurant, restaurant.id in available_ids)
             for restaurant
             in restaurants
         ]
-        products_with_restaurant_availability.append(
-            (product, ordered_availability)
+        version = (
+            product.id,
+            product.updated_at,
+            str(product.category),
+            [
+                (restaurant.id, available)
+                for restaurant, available in ordered_availability
+            ],
         )
+        rows.append((version, {
+            'product': product,
+            'availability': ordered_availability,
+        }))
+    product_rows, fragment_stats = render_rows('product_row.html', rows)
 
     return render(
         request,
         template_name="products_list.html",
         context={
-            'products_with_restaurant_availability':
-                products_with_restaurant_availability,
+            'product_rows': product_rows,
+            'fragment_stats': fragment_stats,
             'restaurants': restaurants,
         }
     )
 
 
+@require_POST
+@user_passes_test(is_manager, login_url='restaurateur:login')
+def update_availability(request):
+    """Switch availability of products in restaurants in bulk.
+
+    Accepts a form or a JSON object with `available` flag and lists of
+    `products` and `restaurants` ids; a missing list means all of them.
+    Form fields may come in the query string, so that cached rows of the
+    menu page submit one shared form holding the CSRF token.
+    """
+    is_json = request.content_type == 'application/json'
+    if is_json:
+        try:
+            data = json.loads(request.body)
+        except ValueError:
+            data = None
+        if not isinstance(data, dict):
+            return JsonResponse(
+                {'errors': {'__all__': ['Ожидается JSON-объект']}},
+                status=400,
+            )
+    else:
+        data = request.GET.copy()
+        data.update(request.POST)
+
+    form = AvailabilityForm(data)
+    if not form.is_valid():
+        if is_json:
+            return JsonResponse({'errors': form.errors}, status=400)
+        return redirect('restaurateur:ProductsView')
+
+    changed = set_availability(
+        form.cleaned_data['available'],
+        product_ids=form.get_ids('products'),
+        restaurant_ids=form.get_ids('restaurants'),
+    )
+    if is_json:
+        return JsonResponse({'changed': changed})
+    return redirect('restaurateur:ProductsView')
+
+
+@user_passes_test(is_manager, login_url='restaurateur:login')
+def view_cache_stats(request):
+    """Report cache hits, misses and hit ratio of every namespace."""
+    stats = cache_stats.get(sorted(namespaces))
+    hits = sum(item['hits'] for item in stats.values())
+    misses = sum(item['misses'] for item in stats.values())
+    return JsonResponse({
+        'backend': settings.CACHES['default']['BACKEND'],
+        'namespaces': stats,
+        'total': {
+            'hits': hits,
+            'misses': misses,
+            'hit_ratio': hits / (hits + misses) if hits + misses else None,
+        },
+    })
+
+
 @user_passes_test(is_manager, login_url='restaurateur:login')
 def view_restaurants(request):
+    restaurant_rows, fragment_stats = render_rows('restaurant_row.html', [
+        ((restaurant.id, restaurant.updated_at), {'restaurant': restaurant})
+        for restaurant in Restaurant.objects.all()
+    ])
     return render(request, template_name="restaurants_list.html", context={
-        'restaurants': Restaurant.objects.all(),
+        'restaurant_rows': restaurant_rows,
+        'fragment_stats': fragment_stats,
     })
 
 
 @user_passes_test(is_manager, login_url='restaurateur:login')
 def view_orders(request):
-    orders = Order.objects.in_process().add_total_price().order_by('status')
-    order_restaurants = list()
-
-    for order in orders:
-        available_restaurants = set()
-        products = [
-            order_product.product
-            for order_product
-            in order.products_inside.all()
-        ]
-        for product in products:
-            product_restaurants = [
-                item.restaurant
-                for item
-                in product.menu_items.filter(availability=True)
-            ]
-        if not available_restaurants:
-            available_restaurants = set(product_restaurants)
-        else:
-            available_restaurants = available_restaurants & set(
-                product_restaurants
-            )
-
-        restaurants_with_distance = list()
-        if not order.geo or not GeoCode.objects.filter(address=order.address):
-            create_geo(order)
-        for restaurant in available_restaurants:
-            if not restaurant.geo:
-                create_geo(restaurant)
-            try:
-                distance = str(round(
-                    get_distance(
-                        (order.geo.lon, order.geo.lat),
-                        (restaurant.geo.lon, restaurant.geo.lat),
-                    ),
-                    3,
-                )) + 'км'
-            except Exception:
-                distance = 'Ошибка определения координат'
-            restaurants_with_distance.append((restaurant, distance))
-
-        restaurants_with_distance.sort(key=lambda item: item[1])
-
-    order_restaurants.append((order, restaurants_with_distance))
+    filters = {
+        'status': request.GET.get('status', ''),
+        'payment': request.GET.get('payment', ''),
+        'restaurant': request.GET.get('restaurant', ''),
+    }
+    orders = (
+        Order.objects
+        .in_process()
+        .select_related('geo', 'restaurant')
+        .prefetch_related('products_inside')
+    )
+    if filters['status']:
+        orders = orders.filter(status=filters['status'])
+    if filters['payment']:
+        orders = orders.filter(payment=filters['payment'])
+    if filters['restaurant'].isdigit():
+        orders = orders.filter(restaurant_id=filters['restaurant'])
+    active_filters = {key: value for key, value in filters.items() if value}
+    cursor = request.GET.get('after')
+    updates_since = timezone.now()
+    orders, next_cursor = paginate_orders(orders, cursor, ORDERS_PAGE_SIZE)
+    restaurants = Restaurant.objects.select_related('geo').in_bulk()
+    availability = load_availability()
+    attach_known_geocodes(orders, restaurants.values())
+
+    order_restaurants = get_order_restaurants(
+        orders,
+        restaurants,
+        availability,
+    )
+    next_url = request.get_full_path()
+    order_rows, fragment_stats = render_rows('order_row.html', [
+        (
+            (
+                order.id,
+                order.updated_at,
+                order.restaurant and order.restaurant.updated_at,
+                order_candidates,
+                more_candidates,
+                next_url,
+            ),
+            {
+                'item': order,
+                'restaurants': order_candidates,
+                'more_restaurants': more_candidates,
+                'next_url': next_url,
+            },
+        )
+        for order, order_candidates, more_candidates in order_restaurants
+    ])
 
     return render(
         request,
         template_name='order_items.html',
         context={
             'order_items': order_restaurants,
+            'order_rows': order_rows,
+            'fragment_stats': fragment_stats,
+            'updates_since': updates_since.isoformat(),
+            'accepts_new_orders': not active_filters and not cursor,
+            'filters': filters,
+            'first_page_query': urlencode(active_filters),
+            'next_page_query': urlencode({
+                **active_filters,
+                'after': next_cursor,
+            }) if next_cursor else None,
+            'statuses': [
+                status for status in Order.ORDER_STATUS
+                if status[0] != '4_ready'
+            ],
+            'payments': Order.PAYMENT,
+            'filter_restaurants': sorted(
+                restaurants.values(),
+                key=lambda restaurant: restaurant.name,
+            ),
         }
     )
 
 
-def fetch_coordinates(apikey, address):
-    base_url = "https://geocode-maps.yandex.ru/1.x"
-    response = requests.get(base_url, params={
-        "geocode": address,
-        "apikey": apikey,
-        "format": "json",
-    })
-    response.raise_for_status()
-    found_places = response.json()['response']['GeoObjectCollection'][
-        'featureMember']
-
-    if not found_places:
-        return None
-
-    most_relevant = found_places[0]
-    lon, lat = most_relevant['GeoObject']['Point']['pos'].split(" ")
-    return lon, lat
-
-
-def get_distance(client_coordinates, restaurant_coordinates):
-    if not client_coordinates or not restaurant_coordinates:
-        raise Exception('Ошибка определения координат')
-    return distance.distance(client_coordinates, restaurant_coordinates).km
+@user_passes_test(is_manager, login_url='restaurateur:login')
+def export_orders(request):
+    """Stream all orders with their products as a JSON array.
+
+    Pass `status` to export orders in some statuses only, e.g.
+    `?status=4_ready`.
+    """
+    orders = Order.objects.all()
+    statuses = request.GET.getlist('status')
+    if statuses:
+        orders = orders.filter(status__in=statuses)
+    response = stream_json_list(
+        iter_orders_export(orders),
+        serialize=lambda order: order,
+    )
+    response['Content-Disposition'] = 'attachment; filename="orders.json"'
+    return response
 
 
-def create_geo(place):
-    """Create GeoCode object for place."""
-    lon, lat = fetch_coordinates(
-        env.str('YANDEX_API_KEY'),
-        place.address,
+@user_passes_test(is_manager, login_url='restaurateur:login')
+def stream_order_updates(request):
+    """Push changed order rows to the board as server-sent events.
+
+    Each stream is a long poll: it ends right after sending the first
+    changes or after ORDER_UPDATES_TIMEOUT seconds without them, and the
+    browser reconnects passing the last event id. A process serves at
+    most ORDER_UPDATES_MAX_STREAMS streams at once, so they can not take
+    all worker threads and database connections.
+    """
+    try:
+        since = parse_datetime(
+            request.headers.get('Last-Event-ID')
+            or request.GET.get('since', '')
+        )
+    except ValueError:
+        since = None
+    since = since or timezone.now()
+    response = StreamingHttpResponse(
+        iter_order_updates(since),
+        content_type='text/event-stream',
     )
-    if lat and lon:
-        geo, created = GeoCode.objects.get_or_create(
-            address=place.address,
-            lon=lon,
-            lat=lat,
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+def iter_order_updates(since):
+    if not order_update_streams.acquire(blocking=False):
+        yield f'retry: {ORDER_UPDATES_BUSY_RETRY}\n\n'
+        return
+    try:
+        yield 'retry: 1000\n\n'
+        deadline = time.monotonic() + ORDER_UPDATES_TIMEOUT
+        while True:
+            events = get_order_update_events(since)
+            if events:
+                yield from events
+                return
+            if time.monotonic() >= deadline:
+                yield ': keep-alive\n\n'
+                return
+            time.sleep(ORDER_UPDATES_POLL_INTERVAL)
+    finally:
+        order_update_streams.release()
+
+
+def get_order_update_events(since):
+    """Return events with rows of orders changed after since.
+
+    Only reads the database: addresses are not looked up and nothing is
+    queued for geocoding, the board does that when it renders.
+    """
+    orders = list(
+        Order.objects
+        .filter(updated_at__gt=since)
+        .select_related('geo', 'restaurant')
+        .prefetch_related('products_inside')
+        .order_by('updated_at')
+    )
+    if not orders:
+        return []
+    next_url = reverse('restaurateur:view_orders')
+    order_restaurants = get_order_restaurants(
+        orders,
+        Restaurant.objects.select_related('geo').in_bulk(),
+        load_availability(),
+    )
+    events = []
+    for order, restaurants, more_restaurants in order_restaurants:
+        update = {
+            'id': order.id,
+            'removed': order.status == '4_ready',
+            'html': render_to_string('order_row.html', {
+                'item': order,
+                'restaurants': restaurants,
+                'more_restaurants': more_restaurants,
+                'next_url': next_url,
+            }),
+        }
+        events.append(
+            f'id: {order.updated_at.isoformat()}\n'
+            f'event: order\n'
+            f'data: {json.dumps(update, ensure_ascii=False)}\n\n'
         )
-        if created:
-            logging.info(f'Geo for order {place.address} created.')
+    return events
+
+
+def get_order_restaurants(orders, restaurants, availability):
+    """Pair every order with restaurants able to cook it, fastest first.
+
+    Only RANKED_RESTAURANTS fastest restaurants are listed, so every order
+    comes with the number of other restaurants that could cook it too.
+    Distances for the whole page of orders are measured at once.
+    """
+    orders_restaurant_ids = [
+        find_restaurant_ids(
+            [
+                order_product.product_id
+                for order_product
+                in order.products_inside.all()
+            ],
+            availability,
+        ) & restaurants.keys()
+        for order in orders
+    ]
+    geocoded = [
+        (order, restaurant_ids)
+        for order, restaurant_ids in zip(orders, orders_restaurant_ids)
+        if order.geo
+    ]
+    rankings = dict(zip(
+        [order.id for order, _ in geocoded],
+        rank_restaurants_many(
+            [(order.geo.lat, order.geo.lon) for order, _ in geocoded],
+            restaurants,
+            restaurant_ids=[restaurant_ids for _, restaurant_ids in geocoded],
+            load=get_kitchen_load(),
+            limit=RANKED_RESTAURANTS,
+        ),
+    ))
+    order_restaurants = list()
+    for order, restaurant_ids in zip(orders, orders_restaurant_ids):
+        ranked_restaurants = rankings.get(order.id, [])
+        restaurants_with_distance = [
+            (
+                restaurants[restaurant_id],
+                f'{round(distance, 3)}км' + (
+                    f', очередь ~{round(wait_minutes)} мин'
+                    if wait_minutes else ''
+                ),
+            )
+            for restaurant_id, distance, wait_minutes in ranked_restaurants
+        ]
+        restaurants_with_distance += [
+            (restaurants[restaurant_id], 'Ошибка определения координат')
+            for restaurant_id in restaurant_ids
+            if not order.geo or not restaurants[restaurant_id].geo
+        ]
+
+        order_restaurants.append((
+            order,
+            restaurants_with_distance,
+            len(restaurant_ids) - len(restaurants_with_distance),
+        ))
+
+    return order_restaurants
+
+
+def attach_known_geocodes(orders, restaurants):
+    """Attach already known GeoCodes to orders and restaurants without them.
+
+    The geocoder is not called while the board renders: orders with
+    unknown addresses are queued for the geocode_orders worker, which also
+    fills in coordinates of restaurants.
+    """
+    places = [
+        place
+        for place in [*orders, *restaurants]
+        if not place.geo_id and place.address
+    ]
+    if not places:
+        return
+    geos = find_geocodes([place.address for place in places])
+    for place in places:
+        geo = geos.get(normalize_address(place.address))
+        if geo:
             place.geo = geo
-            place.save()
+            place.save(update_fields=['geo'])
+    enqueue_geocoding_many([
+        place for place in places
+        if isinstance(place, Order) and not place.geo_id
+    ])
@@ -0,0 +1,185 @@
+import hashlib
+import time
+from collections import Counter
+from threading import Lock
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT
+
+
+STATS_KEY_PREFIX = 'cache-stats'
+
+
+class CacheStats:
+    """Hit and miss counters of cache namespaces shared by all processes.
+
+    Counters are collected in process memory and added to the shared cache
+    at most once per `flush_interval` seconds, so counting does not double
+    the number of cache round trips.
+    """
+
+    def __init__(self, flush_interval):
+        self.flush_interval = flush_interval
+        self._counts = Counter()
+        self._lock = Lock()
+        self._flushed_at = time.monotonic()
+
+    @property
+    def cache(self):
+        return caches[settings.CACHE_STATS_ALIAS]
+
+    def record(self, namespace, hits=0, misses=0):
+        with self._lock:
+            self._counts[f'{namespace}:hits'] += hits
+            self._counts[f'{namespace}:misses'] += misses
+            due = time.monotonic() - self._flushed_at >= self.flush_interval
+        if due:
+            self.flush()
+
+    def flush(self):
+        with self._lock:
+            counts, self._counts = self._counts, Counter()
+            self._flushed_at = time.monotonic()
+        for name, count in counts.items():
+            if not count:
+                continue
+            key = f'{STATS_KEY_PREFIX}:{name}'
+            self.cache.add(key, 0, None)
+            try:
+                self.cache.incr(key, count)
+            except ValueError:
+                self.cache.set(key, count, None)
+
+    def get(self, namespaces):
+        """Return hits, misses and hit ratio of every namespace."""
+        self.flush()
+        counts = self.cache.get_many([
+            f'{STATS_KEY_PREFIX}:{namespace}:{kind}'
+            for namespace in namespaces
+            for kind in ['hits', 'misses']
+        ])
+        stats = {}
+        for namespace in namespaces:
+            hits = counts.get(f'{STATS_KEY_PREFIX}:{namespace}:hits', 0)
+            misses = counts.get(f'{STATS_KEY_PREFIX}:{namespace}:misses', 0)
+            stats[namespace] = {
+                'hits': hits,
+                'misses': misses,
+                'hit_ratio': hits / (hits + misses) if hits + misses else None,
+            }
+        return stats
+
+
+cache_stats = CacheStats(settings.CACHE_STATS_FLUSH_INTERVAL)
+namespaces = {}
+
+
+class CacheNamespace:
+    """Group of cache keys that are invalidated together.
+
+    Keys are stored under the namespace name and its current version, so
+    `invalidate()` makes every key of the namespace stale in all processes
+    with a single write instead of deleting keys one by one.
+    """
+
+    def __init__(self, name, alias='default', timeout=DEFAULT_TIMEOUT):
+        self.name = name
+        self.alias = alias
+        self.timeout = timeout
+        self.version_key = f'{name}:version'
+        namespaces[name] = self
+
+    @property
+    def cache(self):
+        return caches[self.alias]
+
+    def get_timeout(self, timeout):
+        return self.timeout if timeout is DEFAULT_TIMEOUT else timeout
+
+    def make_key(self, key):
+        """Return cache key safe for any backend, memcached included.
+
+        Keys like addresses or file names may contain spaces and Cyrillic,
+        so they are hashed.
+        """
+        digest = hashlib.sha1(str(key).encode()).hexdigest()
+        return f'{self.name}:{digest}'
+
+    def get_version(self):
+        """Return current version, starting a new one if the key is lost.
+
+        Versions are timestamps in nanoseconds and never repeat, so when
+        the version key is culled or evicted, keys written under older
+        versions stay stale instead of becoming valid again.
+        """
+        version = self.cache.get(self.version_key)
+        if version is None:
+            version = time.time_ns()
+            self.cache.add(self.version_key, version, None)
+            version = self.cache.get(self.version_key, version)
+        return version
+
+    def invalidate(self):
+        """Drop all keys of the namespace and return its new version.
+
+        The version is replaced rather than incremented: incr is not
+        atomic on file and database backends, while two concurrent
+        invalidations each storing a new unique version are both safe.
+        """
+        version = time.time_ns()
+        self.cache.set(self.version_key, version, None)
+        return version
+
+    def get(self, key, default=None):
+        value = self.cache.get(
+            self.make_key(key),
+            version=self.get_version(),
+        )
+        if value is None:
+            cache_stats.record(self.name, misses=1)
+            return default
+        cache_stats.record(self.name, hits=1)
+        return value
+
+    def get_many(self, keys):
+        cache_keys = {self.make_key(key): key for key in keys}
+        values = self.cache.get_many(
+            list(cache_keys),
+            version=self.get_version(),
+        )
+        cache_stats.record(
+            self.name,
+            hits=len(values),
+            misses=len(cache_keys) - len(values),
+        )
+        return {
+            cache_keys[cache_key]: value
+            for cache_key, value in values.items()
+        }
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT):
+        self.cache.set(
+            self.make_key(key),
+            value,
+            self.get_timeout(timeout),
+            version=self.get_version(),
+        )
+
+    def set_many(self, values, timeout=DEFAULT_TIMEOUT):
+        self.cache.set_many(
+            {self.make_key(key): value for key, value in values.items()},
+            self.get_timeout(timeout),
+            version=self.get_version(),
+        )
+
+    def delete(self, key):
+        self.cache.delete(self.make_key(key), version=self.get_version())
+
+    def get_or_set(self, key, build, timeout=DEFAULT_TIMEOUT):
+        """Return cached value, building and storing it on a miss."""
+        value = self.get(key)
+        if value is None:
+            value = build()
+            self.set(key, value, timeout)
+        return value
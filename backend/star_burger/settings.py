@@ -1,4 +1,5 @@
 import os
+import sys
 
 from environs import Env
 # os.environ["GIT_PYTHON_REFRESH"] = "quiet"
@@ -9,6 +10,7 @@ env = Env()
 env.read_env()
 
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TESTING = sys.argv[1:2] == ['test']
 STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
 
 
@@ -86,6 +88,41 @@ MEDIA_URL = '/media/'
 
 DATABASES = {'default': env.dj_db_url('POSTGRESQL_DB_URL')}
 
+REDIS_URL = env.str('REDIS_URL', None)
+CACHE_BACKEND = env.str('CACHE_BACKEND', 'redis' if REDIS_URL else 'file')
+if TESTING:
+    CACHE_BACKEND = 'locmem'
+CACHE_MAX_ENTRIES = env.int('CACHE_MAX_ENTRIES', 10000)
+CACHE_BACKENDS = {
+    'redis': {
+        'BACKEND': 'django_redis.cache.RedisCache',
+        'LOCATION': REDIS_URL,
+    },
+    'file': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': env.str('CACHE_DIR', os.path.join(BASE_DIR, '.cache')),
+        'OPTIONS': {'MAX_ENTRIES': CACHE_MAX_ENTRIES},
+    },
+    'db': {
+        'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+        'LOCATION': 'django_cache',
+        'OPTIONS': {'MAX_ENTRIES': CACHE_MAX_ENTRIES},
+    },
+    'locmem': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'OPTIONS': {'MAX_ENTRIES': CACHE_MAX_ENTRIES},
+    },
+}
+CACHES = {
+    'default': {
+        **CACHE_BACKENDS[CACHE_BACKEND],
+        'KEY_PREFIX': 'star_burger',
+        'TIMEOUT': env.int('CACHE_TIMEOUT', 60 * 60),
+    },
+}
+CACHE_STATS_ALIAS = 'default'
+CACHE_STATS_FLUSH_INTERVAL = env.int('CACHE_STATS_FLUSH_INTERVAL', 10)
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
@@ -121,6 +158,15 @@ INTERNAL_IPS = [
 STATICFILES_DIRS = [
     os.path.join(BASE_DIR, "assets"),
 ]
+# Frontend bundles built by Parcel, present once the frontend is built.
+BUNDLES_DIR = os.path.join(BASE_DIR, "bundles")
+if os.path.isdir(BUNDLES_DIR):
+    STATICFILES_DIRS.append(BUNDLES_DIR)
+
+if not TESTING:
+    STATICFILES_STORAGE = (
+        'star_burger.storage.CompressedManifestStaticFilesStorage'
+    )
 
 # ROLLBAR = {
 #     'access_token': env.str(
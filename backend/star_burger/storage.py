@@ -0,0 +1,64 @@
+import gzip
+import os
+
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+COMPRESSIBLE_EXTENSIONS = {
+    '.css',
+    '.html',
+    '.js',
+    '.json',
+    '.map',
+    '.svg',
+    '.txt',
+    '.xml',
+}
+MIN_COMPRESS_SIZE = 256
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    """Manifest storage that also writes .gz and .br copies of assets.
+
+    nginx serves the precompressed copies with `gzip_static` and
+    `brotli_static`, so assets are compressed once at deploy time instead
+    of on every request. Brotli copies are skipped when the `brotli`
+    package is not installed.
+    """
+
+    def post_process(self, paths, dry_run=False, **options):
+        yield from super().post_process(paths, dry_run, **options)
+        if dry_run:
+            return
+        for name in paths:
+            self.compress(name)
+            hashed_name = self.hashed_files.get(
+                self.hash_key(self.clean_name(name))
+            )
+            if hashed_name and hashed_name != name:
+                self.compress(hashed_name)
+
+    def compress(self, name):
+        if os.path.splitext(name)[1].lower() not in COMPRESSIBLE_EXTENSIONS:
+            return
+        path = self.path(name)
+        if not os.path.exists(path):
+            return
+        with open(path, 'rb') as asset:
+            content = asset.read()
+        if len(content) < MIN_COMPRESS_SIZE:
+            return
+        compressors = {'gz': lambda data: gzip.compress(data, mtime=0)}
+        if brotli:
+            compressors['br'] = brotli.compress
+        for extension, compress in compressors.items():
+            compressed = compress(content)
+            if len(compressed) >= len(content):
+                continue
+            with open(f'{path}.{extension}', 'wb') as compressed_asset:
+                compressed_asset.write(compressed)
@@ -40,6 +40,7 @@ class App extends Component {
   }
 
   handleCheckoutModalShow(){
+    this.checkoutIdempotencyKey = `${Date.now()}-${Math.random().toString(36).slice(2)}`;
     this.setState({checkoutModalActive: true});
   }
 
@@ -69,6 +70,7 @@ class App extends Component {
           'Accept': 'application/json',
           'Content-Type': 'application/json',
           'X-CSRFToken': csrfToken,
+          'Idempotency-Key': this.checkoutIdempotencyKey,
         },
         body: JSON.stringify(data),
       });
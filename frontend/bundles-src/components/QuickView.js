@@ -17,7 +17,12 @@ class QuickView extends Component{
         </Modal.Header>
         <Modal.Body>
           <center>
-            <img src={this.props.product.image} style={imageSizing}/>
+            <img
+              src={this.props.product.thumbnail || this.props.product.image}
+              srcSet={(this.props.product.srcset || {}).jpeg}
+              sizes="400px"
+              style={imageSizing}
+            />
             <div className="container-fluid">
               <Table responsive>
                 <thead>